@@ -1,45 +1,30 @@
 import logging
 import streamlit as st
-import asyncio
 import pandas as pd
 from datetime import datetime
 import json
 import os
 import sys
-import io
 import time
 
+# Add the current directory to sys.path to allow imports from onemg_scraper_v2 and db.db
+sys.path.append(os.path.dirname(__file__))
+import logconfig
+
 # Setup Logging
 LOG_FILE = os.path.join(os.path.dirname(__file__), 'scraper.log')
 
 def setup_logging(debug_mode=False):
     level = logging.DEBUG if debug_mode else logging.INFO
-    
-    # TTL Check (6 hours = 21600 seconds)
-    if os.path.exists(LOG_FILE):
-        try:
-            file_age = time.time() - os.path.getmtime(LOG_FILE)
-            if file_age > 21600:
-                with open(LOG_FILE, 'w'):
-                    pass
-                print(f"Log file cleared due to TTL (6 hours)")
-        except Exception as e:
-            print(f"Failed to clear log file during TTL check: {e}")
+    # Records go through a queue to a listener thread, so scrapes never wait on the file;
+    # the file is rotated at 10 MB with three old files kept
+    if logconfig.setup_logging(level, log_file=LOG_FILE, stream=sys.stdout):
+        logging.info(f"Logging initialized at level: {logging.getLevelName(level)}")
 
-    # Reset existing handlers to allow reconfiguration
-    for handler in logging.root.handlers[:]:
-        logging.root.removeHandler(handler)
-    
-    # Configure logging to both file and console
-    logging.basicConfig(
-        level=level,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(LOG_FILE, mode='a', encoding='utf-8'),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
-    logging.info(f"Logging initialized at level: {logging.getLevelName(level)}")
+# One tail reader per server process; each refresh only reads what was appended since the last one
+@st.cache_resource
+def get_log_tail(path):
+    return LogTail(path)
 
 @st.fragment(run_every=2)
 def log_viewer_fragment():
@@ -51,51 +36,44 @@ def log_viewer_fragment():
             show_only_errors = st.checkbox("Show only ERRORS", value=False, key="log_show_errors")
         
         try:
-            with open(LOG_FILE, "r", encoding='utf-8', errors='replace') as f:
-                lines = f.readlines()
-                
-                if show_only_errors:
-                    lines = [line for line in lines if any(s in line.upper() for s in ["ERROR", "CRITICAL", "EXCEPTION", "FAILED"])]
-                
-                if log_search:
-                    lines = [line for line in lines if log_search.lower() in line.lower()]
-                
-                # Show last 500 lines for a better scrollable experience
-                last_lines = lines[-500:]
-                log_content = "".join(last_lines)
+            log_tail = get_log_tail(LOG_FILE)
+            log_tail.poll()
+            # Show last 500 matching lines of the buffered tail for a better scrollable experience
+            log_content = "\n".join(log_tail.search(log_search, errors_only=show_only_errors, limit=500))
+            
+            if log_content:
+                # Use a container with fixed height for scrollability
+                with st.container(height=400, border=True):
+                    st.code(log_content, language="text")
                 
-                if log_content:
-                    # Use a container with fixed height for scrollability
-                    with st.container(height=400, border=True):
-                        st.code(log_content, language="text")
-                    
-                    st.caption(f"Last updated: {datetime.now().strftime('%H:%M:%S')} (Auto-refreshes every 2 seconds)")
-                else:
-                    st.info("No logs found matching the criteria.")
+                st.caption(f"Last updated: {datetime.now().strftime('%H:%M:%S')} (Auto-refreshes every 2 seconds; "
+                           f"searching the last {log_tail.lines.maxlen} lines)")
+            else:
+                st.info("No logs found matching the criteria.")
         except Exception as e:
             st.error(f"Error reading log file: {e}")
     else:
         st.info("No log file found. Logs will appear here once scraping starts.")
 
-def update_log_viewer():
-    """Helper to update the log viewer placeholder."""
-    if 'log_placeholder' in globals():
-        with log_placeholder:
-            log_viewer_fragment()
-
-# Add the current directory to sys.path to allow imports from onemg_scraper_v2 and db.db
-sys.path.append(os.path.dirname(__file__))
-
 # Import logic from the renamed scraper script
-from onemg_scraper_v2 import main as main_1mg, main2 as main2_1mg
+from onemg_scraper_v2 import main as main_1mg, main2 as main2_1mg, search_many as search_many_1mg, detail_many as detail_many_1mg
 import platinumrx_scraper
 import truemeds_scraper
+from fanout import search_all
+from jobs import JobRunner, JobConflictError
+from log_tail import LogTail
+from export import export_scraped_data, discard_export, ExportTooLargeError, FORMATS as EXPORT_FORMATS
+import ratelimit
+import resilience
 from db.db import Database
+from db.cache import ReadCache
 
 SOURCES = {
-    "1MG": {"search": main_1mg, "detail": main2_1mg},
-    "PlatinumRx": {"search": platinumrx_scraper.main, "detail": None},
-    "TrueMeds": {"search": truemeds_scraper.main, "detail": truemeds_scraper.main2},
+    "1MG": {"search": main_1mg, "search_many": search_many_1mg, "detail": main2_1mg, "detail_many": detail_many_1mg},
+    "PlatinumRx": {"search": platinumrx_scraper.main, "search_many": platinumrx_scraper.search_many, "detail": None,
+                   "detail_many": None},
+    "TrueMeds": {"search": truemeds_scraper.main, "search_many": truemeds_scraper.search_many,
+                 "detail": truemeds_scraper.main2, "detail_many": truemeds_scraper.detail_many},
 }
 
 # Set page config
@@ -123,10 +101,8 @@ if debug_mode:
         
         if st.sidebar.button("🗑️ Clear Log File", help="Remove all contents from the log file."):
             try:
-                # Close handlers before clearing to avoid issues on Windows
-                for handler in logging.root.handlers[:]:
-                    logging.root.removeHandler(handler)
-                    handler.close()
+                # Flush and close the handlers before clearing to avoid issues on Windows
+                logconfig.stop_logging()
                 
                 with open(LOG_FILE, 'w'):
                     pass
@@ -139,10 +115,66 @@ headless = st.sidebar.checkbox("Run Browser Headless", value=True)
 limit = st.sidebar.number_input("Products per Search Limit", min_value=1, max_value=100, value=20)
 source = st.sidebar.selectbox("Scrape Source", list(SOURCES.keys()))
 
-# Initialize Database
+# Initialize Database (one long-lived connection shared by all sessions and reruns).
+# DuckDB lets a single process open the file, so while the app runs the CLI
+# scrapers and scheduler.py cannot; run their work as jobs from the app instead.
+@st.cache_resource
+def get_database(path):
+    database = Database(dbpath=path)
+    database.init()
+    return database
+
 db_path = os.path.join(os.path.dirname(__file__), 'db/db.duckdb')
-dbase = Database(dbpath=db_path)
-dbase.init()
+dbase = get_database(db_path)
+
+# Scrapes run on the runner's own event loop, so they outlive reruns, refreshes and sessions
+@st.cache_resource
+def get_job_runner(path):
+    return JobRunner(get_database(path))
+
+runner = get_job_runner(db_path)
+
+# Reads reuse their last result until the tables they depend on change
+@st.cache_resource
+def get_read_cache(path):
+    return ReadCache(get_database(path))
+
+reads = get_read_cache(db_path)
+
+def submit_job(kind, job_source, total, make_coro, params=None):
+    try:
+        job_id = runner.submit(kind, job_source, total, make_coro, params)
+        st.success(f"Started job #{job_id}. Progress is shown under Background Jobs; you can leave this page.")
+    except JobConflictError as e:
+        st.warning(f"Not started: {e}")
+
+@st.fragment(run_every=2)
+def jobs_fragment():
+    active = dbase.get_active_jobs()
+    if active.empty:
+        st.caption("No jobs running.")
+    for job in active.itertuples():
+        col_j1, col_j2 = st.columns([5, 1])
+        processed = job.done + job.failed
+        throughput = f", {job.throughput:.2f} items/s" if pd.notna(job.throughput) else ""
+        col_j1.progress(processed / job.total if job.total else 0.0,
+                        text=f"#{job.id} {job.kind} on {job.source}: {processed}/{job.total} "
+                             f"({job.failed} failed{throughput}) - {job.status}")
+        if job.status != "cancelling" and col_j2.button("Cancel", key=f"cancel_job_{job.id}"):
+            if not runner.cancel(job.id):
+                st.warning(f"Job #{job.id} is not running in this server process.")
+    recent = dbase.get_jobs(limit=10)
+    if not recent.empty:
+        with st.expander("Recent Jobs", expanded=False):
+            st.dataframe(recent[["id", "kind", "source", "status", "total", "done", "failed", "throughput", "error",
+                                 "started_at", "finished_at"]], hide_index=True, width="stretch")
+
+with st.sidebar.expander("Rate Limits", expanded=False):
+    st.caption("Per-source request ceiling and adaptive concurrency (grows on success, halves on 429/5xx, timeouts or captchas).")
+    st.dataframe(pd.DataFrame(ratelimit.snapshot().values()).drop(columns=["throttle_reasons"]), hide_index=True)
+    if resilience.snapshot():
+        st.caption("Circuit breakers (open = source skipped until it recovers).")
+        st.dataframe(pd.DataFrame(resilience.snapshot().values()), hide_index=True)
 
 # Database Management
 st.sidebar.markdown("---")
@@ -151,6 +183,7 @@ if st.sidebar.button("⚠️ Reset Database", help="This will delete ALL scraped
     try:
         dbase.del_()
         dbase.init()
+        reads.invalidate()
         st.sidebar.success("Database reset successfully!")
         st.rerun()
     except Exception as e:
@@ -163,6 +196,9 @@ This app allows you to scrape medicine information from **{source}**.
 You can search for brands to find product links, and then scrape detailed information including compositions and substitutes.
 """)
 
+with st.expander("⚙️ Background Jobs", expanded=True):
+    jobs_fragment()
+
 # Main layout with tabs
 tab1, tab2, tab3 = st.tabs(["🔍 Search Brands", "📄 Scrape Details", "📊 View Data"])
 
@@ -175,17 +211,17 @@ with tab1:
         medicine_name = st.text_input("Enter Medicine Name (e.g., Telma)")
         
         # Check if already searched
-        is_searched = dbase.get_brand_search_status(medicine_name, source)
+        is_searched = reads.get_brand_search_status(medicine_name, source)
         if is_searched:
             st.info(f"'{medicine_name}' has already been searched on {source}.")
             
         if st.button("Start Search", key="single_search"):
             if medicine_name:
-                with st.status(f"Searching for '{medicine_name}' on {source}...") as status:
-                    asyncio.run(SOURCES[source]["search"](medicine_name=medicine_name, max_products=limit, headless=headless, dbase=dbase))
-                    status.update(label=f"Completed search for '{medicine_name}' on {source}!", state="complete")
-                st.success(f"Successfully scraped results for '{medicine_name}' from {source}")
-                st.rerun()
+                search_many = SOURCES[source]["search_many"]
+                submit_job("search", source, 1,
+                           lambda on_progress: search_many([medicine_name], max_products=limit, headless=headless,
+                                                           dbase=dbase, on_progress=lambda done, failed, total: on_progress(done, failed)),
+                           params={"brands": [medicine_name], "limit": limit})
             else:
                 st.error("Please enter a medicine name.")
                 
@@ -198,25 +234,38 @@ with tab1:
                 default_brands = f.read()
         
         brands_input = st.text_area("Enter Medicine Names (one per line)", value=default_brands, height=200)
+        all_sources = st.checkbox("Search all sources at once", value=False,
+                                  help="Search 1MG, PlatinumRx and TrueMeds concurrently instead of only the selected source.")
         
         if st.button("Start Batch Search", key="batch_search"):
             brands = [b.strip() for b in brands_input.split('\n') if b.strip()]
-            if brands:
+            if brands and all_sources:
+                with open(brands_file, 'w') as f:
+                    f.write('\n'.join(brands))
+
+                def search_all_job(on_progress):
+                    per_source = {}
+
+                    def progress(name, done, failed, total):
+                        per_source[name] = (done, failed)
+                        on_progress(sum(d for d, _ in per_source.values()), sum(f for _, f in per_source.values()))
+
+                    return search_all(brands, sources=list(SOURCES), max_products=limit, headless=headless,
+                                      dbase=dbase, on_progress=progress)
+
+                submit_job("search", "ALL", len(brands) * len(SOURCES), search_all_job,
+                           params={"brands": len(brands), "limit": limit})
+            elif brands:
                 # Save to file for persistence
                 with open(brands_file, 'w') as f:
                     f.write('\n'.join(brands))
                 
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                for idx, brand in enumerate(brands):
-                    status_text.text(f"Scraping brand {idx+1}/{len(brands)} from {source}: {brand}")
-                    asyncio.run(SOURCES[source]["search"](medicine_name=brand, max_products=limit, headless=headless, dbase=dbase))
-                    progress_bar.progress((idx + 1) / len(brands))
-                    update_log_viewer()
-                
-                status_text.text("Batch search completed!")
-                st.success(f"Successfully scraped {len(brands)} brands.")
+                # The whole batch runs as one job, sharing one browser/HTTP client and DB writer
+                search_many = SOURCES[source]["search_many"]
+                submit_job("search", source, len(brands),
+                           lambda on_progress: search_many(brands, max_products=limit, headless=headless, dbase=dbase,
+                                                           on_progress=lambda done, failed, total: on_progress(done, failed)),
+                           params={"brands": len(brands), "limit": limit})
             else:
                 st.error("Please enter at least one medicine name.")
 
@@ -230,12 +279,13 @@ with tab2:
         
     if col_b2.button("Clear Pending Brands"):
         dbase.clear_pending_brands(source=source)
+        reads.invalidate()
         st.session_state.show_pending = True
         st.success(f"Cleared all pending brands for {source} from database.")
 
     if st.session_state.get("show_pending"):
         # Get pending brands from DB
-        pending_brands = dbase.get_brands(source=source)
+        pending_brands = reads.get_brands(source=source)
         num_pending = len(pending_brands)
         
         st.info(f"Found **{num_pending}** product URLs for **{source}** in the database pending detailed scraping.")
@@ -249,22 +299,24 @@ with tab2:
                 with st.expander("Show Pending Products", expanded=True):
                     st.dataframe(pending_brands, width="stretch")
                     
+                detail_many = SOURCES[source]["detail_many"]
+                concurrency = st.number_input("Parallel Pages", min_value=1, max_value=32, value=8,
+                                              help="Number of product pages scraped at the same time.")
+
                 if st.button("Start Detailed Scraping", key="detail_scrape"):
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
-                    
-                    for idx, (_, row) in enumerate(pending_brands.iterrows()):
-                        url = row['url']
-                        name = row['medicine_name']
-                        status_text.text(f"Scraping details {idx+1}/{num_pending}: {name} ({url})")
-                        asyncio.run(SOURCES[source]["detail"](medicine_url=url, headless=headless, dbase=dbase))
-                        progress_bar.progress((idx + 1) / num_pending)
-                        update_log_viewer()
-                    
-                    status_text.text("Detailed scraping completed!")
-                    st.success(f"Successfully scraped details for {num_pending} products.")
+                    urls = pending_brands['url'].tolist()
+                    submit_job("detail", source, len(urls),
+                               lambda on_progress: detail_many(urls, headless=headless, dbase=dbase, concurrency=concurrency,
+                                                               on_progress=lambda done, failed, total: on_progress(done, failed)),
+                               params={"concurrency": concurrency})
         else:
             st.warning("No pending URLs found. Please run 'Search Brands' first.")
+
+        failed = reads.get_failed(source=source)
+        if not failed.empty:
+            with st.expander(f"Failed Products ({len(failed)})", expanded=False):
+                st.caption("These URLs failed permanently or ran out of attempts. They are retried when a search finds them again.")
+                st.dataframe(failed, width="stretch")
     else:
         st.info("Click 'Check Pending Brands' to load the current scraping queue.")
 
@@ -272,12 +324,13 @@ with tab3:
     st.header("Scraped Data")
     
     if st.button("Refresh Data", key="refresh_data"):
+        reads.invalidate()
         st.rerun()
         
     try:
-        df = dbase.extract_scraped_data()
-        if not df.empty:
-            st.write(f"Total Scraped Products: {len(df)}")
+        total_scraped = reads.count_scraped()
+        if total_scraped:
+            st.write(f"Total Scraped Products: {total_scraped}")
             
             # --- Filter Section ---
             with st.expander("Filter Options", expanded=True):
@@ -287,102 +340,75 @@ with tab3:
                 search_text = col_f1.text_input("Search Name/Composition", "")
                 
                 # Filter by Source
-                all_sources = sorted(df['source'].unique().tolist())
+                all_sources = reads.get_scraped_sources()
                 selected_sources = col_f2.multiselect("Filter by Source", options=all_sources, default=all_sources)
                 
                 # Filter by Marketer
-                marketers = sorted([m for m in df['medicine_marketer'].unique().tolist() if m])
-                selected_marketers = col_f3.multiselect("Filter by Marketer", options=marketers)
+                selected_marketers = col_f3.multiselect("Filter by Marketer", options=reads.get_marketers())
                 
                 col_f4, col_f5, col_f6 = st.columns(3)
                 
                 # Generic Availability
                 generic_opt = col_f4.radio("Generic Alternative Available", ["All", "Yes", "No"], horizontal=True)
-                
-                # Price Range
-                # price_data = df['medicine_selling_price'].dropna()
-                # if not price_data.empty:
-                #     min_price = float(price_data.min())
-                #     max_price = float(price_data.max())
-                #     if min_price == max_price:
-                #         col_f5.info(f"Price: ₹{min_price}")
-                #         price_range = (min_price, max_price)
-                #     else:
-                #         price_range = col_f5.slider("Price Range (₹)", min_price, max_price, (min_price, max_price))
-                # else:
-                #     price_range = (0.0, float('inf'))
-                
-                # Discount Range
-                # discount_data = df['medicine_discount'].dropna()
-                # if not discount_data.empty:
-                #     min_disc = float(discount_data.min())
-                #     max_disc = float(discount_data.max())
-                #     if min_disc == max_disc:
-                #         col_f6.info(f"Discount: {min_disc}%")
-                #         discount_range = (min_disc, max_disc)
-                #     else:
-                #         discount_range = col_f6.slider("Discount Range (%)", min_disc, max_disc, (min_disc, max_disc))
-                # else:
-                #     discount_range = (0.0, 100.0)
-                
-            # Apply Filters
-            filtered_df = df.copy()
-            
-            if selected_sources:
-                filtered_df = filtered_df[filtered_df['source'].isin(selected_sources)]
-            
-            if search_text:
-                filtered_df = filtered_df[
-                    filtered_df['medicine_name'].str.contains(search_text, case=False, na=False) |
-                    filtered_df['medicine_composition'].str.contains(search_text, case=False, na=False)
-                ]
-            
-            if selected_marketers:
-                filtered_df = filtered_df[filtered_df['medicine_marketer'].isin(selected_marketers)]
-                
-            if generic_opt == "Yes":
-                filtered_df = filtered_df[filtered_df['generic_alternative_available'] == True]
-            elif generic_opt == "No":
-                filtered_df = filtered_df[filtered_df['generic_alternative_available'] == False]
-                
-            # filtered_df = filtered_df[
-            #     (filtered_df['medicine_selling_price'] >= price_range[0]) &
-            #     (filtered_df['medicine_selling_price'] <= price_range[1])
-            # ]
-            
-            # filtered_df = filtered_df[
-            #     (filtered_df['medicine_discount'] >= discount_range[0]) &
-            #     (filtered_df['medicine_discount'] <= discount_range[1])
-            # ]
-            
-            st.write(f"Filtered Results: {len(filtered_df)}")
-            
-            # Export options (using filtered_df)
-            col1, col2 = st.columns(2)
-            
-            now = datetime.now().strftime("%Y%m%d_%H%M%S")
-            csv = filtered_df.to_csv(index=False).encode('utf-8')
-            col1.download_button(
-                label="Download as CSV",
-                data=csv,
-                file_name=f'scraped_data_{now}.csv',
-                mime='text/csv',
-                key="download_csv"
-            )
+
+                # Pagination
+                page_size = col_f5.selectbox("Rows per Page", [50, 100, 250, 500], index=1)
+
+            # Filters are applied in DuckDB; only the current page is loaded into pandas
+            filters = {
+                "search_text": search_text.strip() or None,
+                "sources": selected_sources,
+                "marketers": selected_marketers,
+                "generic": {"Yes": True, "No": False}.get(generic_opt),
+            }
+            filtered_count = reads.count_scraped(**filters)
+            st.write(f"Filtered Results: {filtered_count}")
+
+            pages = max(1, -(-filtered_count // page_size))
+            page = col_f6.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1)
             
-            # Excel export (using io.BytesIO)
-            buffer = io.BytesIO()
-            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                filtered_df.to_excel(writer, index=False)
-            col2.download_button(
-                label="Download as Excel",
-                data=buffer.getvalue(),
-                file_name=f'scraped_data_{now}.xlsx',
-                mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                key="download_excel"
-            )
+            # Exports are only built when asked for, streamed from DuckDB to a temporary file
+            col1, col2, col3 = st.columns([1, 1, 2])
+            export_fmt = col1.selectbox("Export Format", list(EXPORT_FORMATS), format_func=lambda f: EXPORT_FORMATS[f]["label"],
+                                        label_visibility="collapsed")
+            export = st.session_state.get("export")
+            if export and export["filters"] != filters:
+                # The prepared file no longer matches what is shown; do not leave it in the temp directory
+                discard_export(st.session_state.pop("export")["path"])
+            if col2.button("Prepare Export", key="prepare_export"):
+                previous = st.session_state.pop("export", None)
+                if previous:
+                    discard_export(previous["path"])
+                try:
+                    with st.spinner(f"Exporting {filtered_count} rows..."):
+                        path = export_scraped_data(dbase, export_fmt, **filters)
+                    st.session_state.export = {"path": path, "fmt": export_fmt, "filters": filters, "rows": filtered_count}
+                except ExportTooLargeError as e:
+                    st.warning(str(e))
+
+            def on_export_downloaded():
+                # The button already holds the file's bytes, so the file itself is no longer needed
+                done = st.session_state.pop("export", None)
+                if done:
+                    discard_export(done["path"])
+
+            export = st.session_state.get("export")
+            if export and os.path.exists(export["path"]):
+                export_format = EXPORT_FORMATS[export["fmt"]]
+                now = datetime.now().strftime("%Y%m%d_%H%M%S")
+                with open(export["path"], "rb") as f:
+                    col3.download_button(
+                        label=f"Download {export_format['label']} ({export['rows']} rows)",
+                        data=f,
+                        file_name=f'scraped_data_{now}.{export_format["extension"]}',
+                        mime=export_format["mime"],
+                        key="download_export",
+                        on_click=on_export_downloaded
+                    )
             
-            st.dataframe(filtered_df)
+            st.dataframe(reads.get_scraped_page(limit=page_size, offset=(page - 1) * page_size, **filters))
+            if filtered_count:
+                st.caption(f"Showing rows {(page - 1) * page_size + 1}-{min(page * page_size, filtered_count)} of {filtered_count}")
         else:
             st.write("No data found in the database.")
     except Exception as e:
@@ -0,0 +1,83 @@
+import argparse
+import os
+import tempfile
+import time
+import duckdb
+from db.db import Database
+
+
+class PerCallConnectDatabase(Database):
+    """Reproduces the previous behaviour: a fresh duckdb.connect() for every method call."""
+
+    def _cursor(self):
+        return duckdb.connect(self.dbpath)
+
+
+def make_medicine(i):
+    return {
+        "medicine_url": f"https://www.1mg.com/drugs/bench-medicine-{i}",
+        "medicine_id": str(i),
+        "medicine_name": f"Bench Medicine {i}",
+        "mrp": 100.0 + i % 50,
+        "pack_size_quantity": "strip of 10 tablets",
+        "selling_price": 90.0 + i % 50,
+        "discount_percentage": 10,
+    }
+
+
+def make_scraped_details(i):
+    return {
+        "medicine_url": f"https://www.1mg.com/drugs/bench-medicine-{i}",
+        "medicine_name": f"Bench Medicine {i}",
+        "medicine_composition": "Telmisartan (40mg)",
+        "medicine_marketer": "Bench Pharma Ltd",
+        "medicine_storage": "Store below 30°C",
+        "medicine_mrp": 100.0 + i % 50,
+        "medicine_selling_price": 90.0 + i % 50,
+        "medicine_discount": 10,
+        "pack_size_information": "strip of 10 tablets",
+        "substitutes": [],
+        "generic_alternative_available": False,
+        "generic_alternative": None,
+    }
+
+
+def run(db_class, n, bulk=False, rewrite=False):
+    """
+    Insert n medicines and their scraped details (what one search + detail pass writes).
+    With `rewrite`, time writing the same scraped details a second time instead.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        dbase = db_class(dbpath=os.path.join(tmp, 'bench.duckdb'))
+        dbase.init()
+        if rewrite:
+            dbase.insert_medicines_bulk([make_medicine(i) for i in range(n)], '1MG')
+            dbase.insert_scraped_details_bulk([make_scraped_details(i) for i in range(n)], '1MG')
+        start = time.perf_counter()
+        if rewrite:
+            dbase.insert_scraped_details_bulk([make_scraped_details(i) for i in range(n)], '1MG')
+        elif bulk:
+            dbase.insert_medicines_bulk([make_medicine(i) for i in range(n)], '1MG')
+            dbase.insert_scraped_details_bulk([make_scraped_details(i) for i in range(n)], '1MG')
+        else:
+            for i in range(n):
+                dbase.insert_medicine(make_medicine(i), '1MG')
+                dbase.insert_scraped_details(make_scraped_details(i), '1MG')
+        elapsed = time.perf_counter() - start
+        dbase.close()
+    return n / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Database upsert throughput.")
+    parser.add_argument("-n", type=int, default=500, help="Number of records to upsert")
+    args = parser.parse_args()
+
+    before = run(PerCallConnectDatabase, args.n)
+    after = run(Database, args.n)
+    bulk = run(Database, args.n, bulk=True)
+    rewrite = run(Database, args.n, rewrite=True)
+    print(f"connect per call : {before:8.1f} upserts/sec")
+    print(f"shared connection: {after:8.1f} upserts/sec ({after / before:.1f}x)")
+    print(f"bulk upsert      : {bulk:8.1f} upserts/sec ({bulk / before:.1f}x)")
+    print(f"unchanged rewrite: {rewrite:8.1f} upserts/sec ({rewrite / before:.1f}x, skipped by content hash)")
@@ -0,0 +1,95 @@
+import logging
+import re
+from collections import Counter
+
+# Rough transfer sizes used to estimate what a blocked request would have cost;
+# an aborted request never reports its real size.
+ESTIMATED_BYTES = {
+    "image": 40_000,
+    "media": 500_000,
+    "font": 45_000,
+    "stylesheet": 30_000,
+    "script": 60_000,
+    "xhr": 5_000,
+    "fetch": 5_000,
+    "ping": 500,
+    "other": 5_000,
+}
+
+# Third-party analytics, ads and tracking beacons. None of them affect the DOM we read.
+TRACKER_PATTERNS = [
+    r"google-analytics\.com", r"googletagmanager\.com", r"doubleclick\.net", r"googlesyndication\.com",
+    r"googleadservices\.com", r"facebook\.(net|com)/tr", r"connect\.facebook\.net", r"hotjar\.com",
+    r"clarity\.ms", r"branch\.io", r"moengage\.com", r"webengage\.com", r"criteo\.(com|net)",
+    r"taboola\.com", r"newrelic\.com", r"nr-data\.net", r"sentry\.io", r"/collect\?", r"/beacon",
+]
+
+
+class BlockingProfile:
+    """
+    Request-interception rules for a Playwright browser context.
+
+    A request is aborted when its resource type is in `block_resource_types` or
+    its URL matches one of `block_url_patterns`, unless it matches one of
+    `allow_url_patterns`. Counts of blocked/allowed requests and an estimate of
+    the bytes saved are kept across every context the profile is installed on.
+    """
+
+    def __init__(self, name, block_resource_types=(), block_url_patterns=(), allow_url_patterns=()):
+        self.name = name
+        self.block_resource_types = set(block_resource_types)
+        self.block_url_patterns = [re.compile(p, re.IGNORECASE) for p in block_url_patterns]
+        self.allow_url_patterns = [re.compile(p, re.IGNORECASE) for p in allow_url_patterns]
+        self.allowed = 0
+        self.blocked = 0
+        self.blocked_by_type = Counter()
+        self.estimated_bytes_saved = 0
+
+    def should_block(self, resource_type, url):
+        if any(p.search(url) for p in self.allow_url_patterns):
+            return False
+        if resource_type in self.block_resource_types:
+            return True
+        return any(p.search(url) for p in self.block_url_patterns)
+
+    async def install(self, context):
+        await context.route("**/*", self._handle)
+
+    async def _handle(self, route):
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self.blocked += 1
+            self.blocked_by_type[request.resource_type] += 1
+            self.estimated_bytes_saved += ESTIMATED_BYTES.get(request.resource_type, ESTIMATED_BYTES["other"])
+            await route.abort()
+        else:
+            self.allowed += 1
+            await route.continue_()
+
+    def stats(self):
+        return {
+            "profile": self.name,
+            "allowed": self.allowed,
+            "blocked": self.blocked,
+            "blocked_by_type": dict(self.blocked_by_type),
+            "estimated_mb_saved": round(self.estimated_bytes_saved / 1_000_000, 1),
+        }
+
+    def log_stats(self):
+        logging.info(f"Request blocking: {self.stats()}")
+
+
+# Stylesheets stay allowed for 1mg: the scraper reads innerText, which depends on
+# CSS visibility, and without the site CSS hidden duplicate labels leak into the text.
+PROFILES = {
+    "1MG": BlockingProfile(
+        "1MG",
+        block_resource_types=("image", "media", "font"),
+        block_url_patterns=TRACKER_PATTERNS,
+    ),
+}
+
+
+def get_profile(source):
+    """Return the blocking profile for `source`, or None if requests are not filtered for it."""
+    return PROFILES.get(source)
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+
+
+class BrowserManager:
+    """
+    Owns a single Chromium instance for a whole run (or one worker).
+
+    Callers borrow the browser with `async with manager.browser() as browser:`
+    and open their own contexts/pages on it, exactly as they would on a freshly
+    launched browser. Chromium is launched on the first borrow, so a run that
+    never needs a browser never starts one. After `recycle_after` borrows a new Chromium is launched
+    for subsequent callers and the old one is closed as soon as its last borrower
+    is done, which keeps memory growth of long runs bounded. A browser that has
+    crashed or disconnected is replaced on the next borrow.
+    """
+
+    def __init__(self, headless=True, recycle_after=100):
+        self.headless = headless
+        self.recycle_after = recycle_after
+        self.launches = 0
+        self.pages_served = 0
+        self._playwright = None
+        self._browser = None
+        self._pages = 0
+        self._active = {}
+        self._lock = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def start(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+    async def close(self):
+        for browser in list(self._active):
+            await self._close_browser(browser)
+        self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+        logging.info(f"Browser manager closed: {self.pages_served} pages served by {self.launches} browser launches")
+
+    @asynccontextmanager
+    async def browser(self):
+        async with self._lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            if self._browser is None:
+                await self._launch()
+            elif self._pages >= self.recycle_after or not self._browser.is_connected():
+                logging.info(f"Recycling browser after {self._pages} pages")
+                old = self._browser
+                await self._launch()
+                if self._active.get(old) == 0:
+                    await self._close_browser(old)
+            browser = self._browser
+            self._pages += 1
+            self.pages_served += 1
+            self._active[browser] += 1
+        try:
+            yield browser
+        finally:
+            # close() may have closed the browser (and forgotten it) while it was borrowed
+            active = self._active.get(browser)
+            if active is not None:
+                self._active[browser] = active - 1
+                if browser is not self._browser and active == 1:
+                    await self._close_browser(browser)
+
+    async def _launch(self):
+        self._browser = await self._playwright.chromium.launch(headless=self.headless)
+        self._active[self._browser] = 0
+        self._pages = 0
+        self.launches += 1
+
+    async def _close_browser(self, browser):
+        self._active.pop(browser, None)
+        try:
+            await browser.close()
+        except Exception as e:
+            logging.debug(f"Error closing browser: {e}")
+
+
+@asynccontextmanager
+async def use_browser(browser_manager=None, headless=True):
+    """Borrow a browser from `browser_manager`, or launch a one-off browser if there is none."""
+    if browser_manager is not None:
+        async with browser_manager.browser() as browser:
+            yield browser
+    else:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=headless)
+            try:
+                yield browser
+            finally:
+                await browser.close()
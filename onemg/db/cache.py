@@ -0,0 +1,106 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+
+# Tables each cached read depends on
+READ_TABLES = {
+    "get_brand_search_status": ("brand_searches",),
+    "get_brands": ("medicine_details", "medicines"),
+    "get_failed": ("medicine_details", "medicines"),
+    "get_scraped_page": ("medicine_scraped_details",),
+    "count_scraped": ("medicine_scraped_details",),
+    "get_scraped_sources": ("medicine_scraped_details",),
+    "get_marketers": ("medicine_scraped_details",),
+}
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def _size(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    return sys.getsizeof(value)
+
+
+class ReadCache:
+    """
+    LRU cache in front of the Database reads listed in READ_TABLES.
+
+    Call the reads on the cache as on the Database (`cache.get_brands(source=...)`).
+    A result is reused until the watermark (row count and max(updatedAt)) of a
+    table it depends on moves. Watermarks are themselves reused for
+    `watermark_ttl` seconds, so while a scrape is writing a table its reads are
+    reloaded at most that often rather than on every rerun. Entries are evicted
+    least recently used first once they take more than `max_bytes`.
+    Call invalidate() after writing from the caller's own thread so the next
+    read sees the change at once. Cached DataFrames are shared: do not modify them.
+    """
+
+    def __init__(self, dbase, max_bytes=256 * 2 ** 20, watermark_ttl=2.0):
+        self.dbase = dbase
+        self.max_bytes = max_bytes
+        self.watermark_ttl = watermark_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._watermarks = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name not in READ_TABLES:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.read(name, *args, **kwargs)
+
+    def watermark(self, table):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._watermarks.get(table)
+        if cached and now - cached[0] < self.watermark_ttl:
+            return cached[1]
+        mark = self.dbase.watermark(table)
+        with self._lock:
+            self._watermarks[table] = (now, mark)
+        return mark
+
+    def read(self, name, *args, **kwargs):
+        key = (name, _freeze(args), _freeze(kwargs))
+        marks = tuple(self.watermark(table) for table in READ_TABLES[name])
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == marks:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = getattr(self.dbase, name)(*args, **kwargs)
+        size = _size(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            if size <= self.max_bytes:
+                self._entries[key] = (marks, value, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, _, evicted) = self._entries.popitem(last=False)
+                    self._bytes -= evicted
+        return value
+
+    def invalidate(self):
+        """Forget the remembered watermarks so the next reads check the tables again."""
+        with self._lock:
+            self._watermarks.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
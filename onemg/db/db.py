@@ -1,14 +1,133 @@
 from abc import ABC
+from contextlib import contextmanager
+import hashlib
 import json
+import threading
+import time
 import duckdb
+import pandas as pd
+
+MEDICINE_COLUMNS = [
+    "url", "medicine_id", "medicine_name", "mrp", "pack_size_quantity", "selling_price",
+    "discount_percentage", "source",
+]
+
+SCRAPED_DETAILS_COLUMNS = [
+    "medicine_url", "medicine_name", "medicine_composition", "medicine_marketer", "medicine_storage",
+    "medicine_mrp", "medicine_selling_price", "medicine_discount", "pack_size_information", "substitutes",
+    "generic_alternative_available", "generic_alternative", "source",
+]
+
+# Column types of medicine_scraped_details other than TEXT, for comparing staged rows with stored ones
+SCRAPED_DETAILS_TYPES = {
+    "medicine_mrp": "REAL", "medicine_selling_price": "REAL", "medicine_discount": "REAL",
+    "generic_alternative_available": "BOOLEAN", "generic_alternative": "JSON",
+}
+
+
+def _medicine_row(medicine, source):
+    return (medicine['medicine_url'], medicine['medicine_id'], medicine['medicine_name'], medicine['mrp'], medicine['pack_size_quantity'], medicine['selling_price'], medicine['discount_percentage'], source)
+
+
+def _scraped_details_row(medicine, source):
+    return (medicine['medicine_url'], medicine['medicine_name'], medicine['medicine_composition'], medicine['medicine_marketer'], medicine['medicine_storage'], medicine['medicine_mrp'], medicine['medicine_selling_price'], medicine['medicine_discount'], medicine['pack_size_information'], str(medicine['substitutes']) if 'substitutes' in medicine else None, medicine.get('generic_alternative_available'), json.dumps(medicine.get('generic_alternative')) if medicine.get('generic_alternative') else None, source)
+
+
+def _content_hash(row):
+    """Stable hash of a row tuple; equal rows hash equal across runs and processes."""
+    return hashlib.blake2b(json.dumps(row, default=str).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _changed_fields_sql(staged, stored):
+    """SQL list of the scraped-details columns whose value differs between the `staged` and `stored` rows."""
+    checks = ", ".join(f"CASE WHEN CAST({staged}.{c} AS {SCRAPED_DETAILS_TYPES.get(c, 'TEXT')}) IS DISTINCT FROM {stored}.{c} "
+                       f"THEN '{c}' END" for c in SCRAPED_DETAILS_COLUMNS[1:])
+    return f"list_filter([{checks}], lambda f: f IS NOT NULL)"
+
+
+def _upsert_sql(table, columns, values):
+    """INSERT ... ON CONFLICT DO UPDATE for all columns; `values` is a VALUES (...) list or a SELECT."""
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in columns)
+    return (f"INSERT INTO {table} ({', '.join(columns)}) {values} "
+            f"ON CONFLICT DO UPDATE SET {updates}, updatedAt = current_localtimestamp()")
+
+
+def _scraped_filters(search_text=None, sources=None, marketers=None, generic=None):
+    """WHERE clause and parameters for the View Data filters on medicine_scraped_details."""
+    clauses, params = [], []
+    if search_text:
+        clauses.append("(contains(lower(medicine_name), ?) OR contains(lower(medicine_composition), ?))")
+        params += [search_text.lower(), search_text.lower()]
+    if sources:
+        clauses.append("source IN (SELECT unnest(?::TEXT[]))")
+        params.append(list(sources))
+    if marketers:
+        clauses.append("medicine_marketer IN (SELECT unnest(?::TEXT[]))")
+        params.append(list(marketers))
+    if generic is not None:
+        clauses.append("generic_alternative_available = ?")
+        params.append(generic)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
 
 class Database():
+    """
+    DuckDB access layer.
+
+    The database file is opened once and the connection is kept for the lifetime
+    of the object. Every thread gets its own cursor on that connection (DuckDB
+    connections must not be shared between threads), so the Streamlit script
+    thread and any worker threads can use the same instance. Call close() or use
+    the instance as a context manager to release the file.
+    """
 
     def __init__(self, dbpath: str = None):
         self.dbpath = dbpath or 'db/db.duckdb'
+        self._conn = None
+        self._cursors = {}
+        self._lock = threading.Lock()
+        self._claim_lock = threading.Lock()
+
+    def __enter__(self):
+        self._cursor()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _cursor(self):
+        """Return the calling thread's cursor, opening the connection on first use."""
+        thread = threading.current_thread()
+        with self._lock:
+            if self._conn is None:
+                try:
+                    self._conn = duckdb.connect(self.dbpath)
+                except duckdb.IOException as e:
+                    if "lock" not in str(e):
+                        raise
+                    # Only one process may open the file; the Streamlit app holds it for as long as it runs
+                    raise duckdb.IOException(f"{e}\nThe database is in use by another process, usually the Streamlit app. "
+                                             "Start the scrape from the app, or stop the app first.") from e
+            cursor = self._cursors.get(thread)
+            if cursor is None:
+                # Drop cursors of threads that have finished (e.g. old Streamlit script runs)
+                for t in [t for t in self._cursors if not t.is_alive()]:
+                    self._cursors.pop(t).close()
+                cursor = self._conn.cursor()
+                self._cursors[thread] = cursor
+            return cursor
+
+    def close(self):
+        with self._lock:
+            for cursor in self._cursors.values():
+                cursor.close()
+            self._cursors.clear()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
 
     def init(self):
-        db = duckdb.connect(self.dbpath)
+        db = self._cursor()
         db.execute("""
         CREATE TABLE IF NOT EXISTS medicines (
             url TEXT PRIMARY KEY,
@@ -27,6 +146,13 @@ class Database():
             url TEXT PRIMARY KEY,
             source TEXT,
             scraped boolean DEFAULT FALSE,
+            claimed_by TEXT,
+            lease_expires_at TIMESTAMP,
+            attempts INTEGER DEFAULT 0,
+            failed BOOLEAN DEFAULT FALSE,
+            last_error TEXT,
+            next_due_at TIMESTAMP,
+            priority REAL DEFAULT 1.0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
@@ -45,18 +171,54 @@ class Database():
             generic_alternative_available BOOLEAN,
             generic_alternative JSON,
             source TEXT,
+            content_hash TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
 
+        CREATE SEQUENCE IF NOT EXISTS medicine_change_log_id_seq;
+
+        CREATE TABLE IF NOT EXISTS medicine_change_log (
+            id BIGINT PRIMARY KEY DEFAULT nextval('medicine_change_log_id_seq'),
+            medicine_url TEXT NOT NULL,
+            source TEXT,
+            change TEXT,
+            changed_fields TEXT[],
+            previous_hash TEXT,
+            content_hash TEXT,
+            changed_at TIMESTAMP DEFAULT current_localtimestamp()
+        );
+
         CREATE TABLE IF NOT EXISTS brand_searches (
             brand_name TEXT,
             source TEXT,
             scraped BOOLEAN DEFAULT TRUE,
+            last_error TEXT,
+            next_due_at TIMESTAMP,
+            priority REAL DEFAULT 1.0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             PRIMARY KEY (brand_name, source)
         );
+
+        CREATE SEQUENCE IF NOT EXISTS jobs_id_seq;
+
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY DEFAULT nextval('jobs_id_seq'),
+            kind TEXT NOT NULL,
+            source TEXT,
+            params JSON,
+            status TEXT DEFAULT 'queued',
+            total INTEGER DEFAULT 0,
+            done INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            throughput REAL,
+            error TEXT,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
         """)
         
         # Migrations for existing tables
@@ -64,10 +226,23 @@ class Database():
             db.execute("ALTER TABLE medicine_details ADD COLUMN source TEXT;")
         except:
             pass
-        try:
-            db.execute("ALTER TABLE medicine_scraped_details ADD COLUMN source TEXT;")
-        except:
-            pass
+        for column in ("source TEXT", "content_hash TEXT"):
+            try:
+                db.execute(f"ALTER TABLE medicine_scraped_details ADD COLUMN {column};")
+            except:
+                pass
+        for column in ("claimed_by TEXT", "lease_expires_at TIMESTAMP", "attempts INTEGER DEFAULT 0",
+                       "failed BOOLEAN DEFAULT FALSE", "last_error TEXT", "next_due_at TIMESTAMP",
+                       "priority REAL DEFAULT 1.0"):
+            try:
+                db.execute(f"ALTER TABLE medicine_details ADD COLUMN {column};")
+            except:
+                pass
+        for column in ("last_error TEXT", "next_due_at TIMESTAMP", "priority REAL DEFAULT 1.0"):
+            try:
+                db.execute(f"ALTER TABLE brand_searches ADD COLUMN {column};")
+            except:
+                pass
         # try:
         #     db.execute("ALTER TABLE medicines ALTER medicine_id DROP NOT NULL;")
         # except:
@@ -76,100 +251,481 @@ class Database():
 
 
     def del_(self):
-        db = duckdb.connect(self.dbpath)
+        db = self._cursor()
         db.execute("DROP TABLE IF EXISTS medicines;")
         db.execute("DROP TABLE IF EXISTS medicine_details;")
         db.execute("DROP TABLE IF EXISTS medicine_scraped_details;")
         db.execute("DROP TABLE IF EXISTS brand_searches;")
+        db.execute("DROP TABLE IF EXISTS jobs;")
+        db.execute("DROP TABLE IF EXISTS medicine_change_log;")
+        db.execute("DROP SEQUENCE IF EXISTS medicine_change_log_id_seq;")
+        db.execute("DROP SEQUENCE IF EXISTS jobs_id_seq;")
 
 
     def insert_medicine(self, medicine, source):
-        db = duckdb.connect(self.dbpath)
-        db.execute(f"INSERT INTO medicines (url, medicine_id, medicine_name, mrp, pack_size_quantity, selling_price, discount_percentage, source) "
-                   f"VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
-                   f"ON CONFLICT DO UPDATE "
-                   f"SET url = EXCLUDED.url, "
-                   f"medicine_id = EXCLUDED.medicine_id, "
-                   f"medicine_name = EXCLUDED.medicine_name, "
-                   f"mrp = EXCLUDED.mrp, "
-                   f"pack_size_quantity = EXCLUDED.pack_size_quantity, "
-                   f"selling_price = EXCLUDED.selling_price, "
-                   f"discount_percentage = EXCLUDED.discount_percentage, "
-                   f"source = EXCLUDED.source, "
-                   f"updatedAt = current_localtimestamp()"
-                   , (medicine['medicine_url'], medicine['medicine_id'], medicine['medicine_name'], medicine['mrp'], medicine['pack_size_quantity'], medicine['selling_price'], medicine['discount_percentage'], source))
-
-        db.execute("INSERT INTO medicine_details (url, source) VALUES (?, ?) ON CONFLICT DO UPDATE SET scraped = FALSE, updatedAt = current_localtimestamp()", (medicine['medicine_url'], source))
+        db = self._cursor()
+        db.execute(_upsert_sql("medicines", MEDICINE_COLUMNS, f"VALUES ({', '.join('?' * len(MEDICINE_COLUMNS))})"),
+                   _medicine_row(medicine, source))
+
+        db.execute("INSERT INTO medicine_details (url, source) VALUES (?, ?) ON CONFLICT DO UPDATE SET scraped = FALSE, attempts = 0, failed = FALSE, last_error = NULL, updatedAt = current_localtimestamp()", (medicine['medicine_url'], source))
 
 
     def insert_scraped_details(self, medicine, source):
-        db = duckdb.connect(self.dbpath)
-        db.execute(f"INSERT INTO medicine_scraped_details (medicine_url, medicine_name, medicine_composition, medicine_marketer, medicine_storage, medicine_mrp, medicine_selling_price, medicine_discount, pack_size_information, substitutes, generic_alternative_available, generic_alternative, source) "
-                   f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
-                   f"ON CONFLICT DO UPDATE "
-                   f"SET medicine_url = EXCLUDED.medicine_url, "
-                   f"medicine_name = EXCLUDED.medicine_name, "
-                   f"medicine_composition = EXCLUDED.medicine_composition, "
-                   f"medicine_marketer = EXCLUDED.medicine_marketer, "
-                   f"medicine_storage = EXCLUDED.medicine_storage, "
-                   f"medicine_mrp = EXCLUDED.medicine_mrp, "
-                   f"medicine_selling_price = EXCLUDED.medicine_selling_price, "
-                   f"medicine_discount = EXCLUDED.medicine_discount, "
-                   f"pack_size_information = EXCLUDED.pack_size_information, "
-                   f"substitutes = EXCLUDED.substitutes, "
-                   f"generic_alternative_available = EXCLUDED.generic_alternative_available, "
-                   f"generic_alternative = EXCLUDED.generic_alternative,"
-                   f"source = EXCLUDED.source,"
-                   f"updatedAt = current_localtimestamp()"
-                   , (medicine['medicine_url'], medicine['medicine_name'], medicine['medicine_composition'], medicine['medicine_marketer'], medicine['medicine_storage'], medicine['medicine_mrp'], medicine['medicine_selling_price'], medicine['medicine_discount'], medicine['pack_size_information'], str(medicine['substitutes']) if 'substitutes' in medicine else None, medicine.get('generic_alternative_available'), json.dumps(medicine.get('generic_alternative')) if medicine.get('generic_alternative') else None, source))
-
-        self.update_scraped(medicine['medicine_url'])
+        self.insert_scraped_details_bulk([medicine], source)
+
+
+    def insert_medicines_bulk(self, records, source):
+        """
+        Upsert a batch of search results and queue their URLs for detail scraping.
+
+        The batch is staged as a registered DataFrame and applied with one set-based
+        upsert per table inside a single transaction. Returns the number of distinct
+        URLs written.
+        """
+        rows = {row[0]: row for row in (_medicine_row(m, source) for m in records)}
+        if not rows:
+            return 0
+        staged = pd.DataFrame(list(rows.values()), columns=MEDICINE_COLUMNS, dtype=object)
+
+        with self._staged(staged, "staged_medicines") as db:
+            db.execute(_upsert_sql("medicines", MEDICINE_COLUMNS, f"SELECT {', '.join(MEDICINE_COLUMNS)} FROM staged_medicines"))
+            db.execute("INSERT INTO medicine_details (url, source) SELECT url, source FROM staged_medicines "
+                       "ON CONFLICT DO UPDATE SET scraped = FALSE, attempts = 0, failed = FALSE, last_error = NULL, updatedAt = current_localtimestamp()")
+        return len(rows)
+
+
+    def insert_scraped_details_bulk(self, records, source):
+        """
+        Upsert a batch of scraped product details and mark their URLs as scraped.
+
+        Same staging approach as insert_medicines_bulk(). Each row carries a hash
+        of its content: rows whose hash matches the stored one are not rewritten
+        (their updatedAt stays put), and every new or changed product gets an
+        entry in medicine_change_log naming the fields that moved. Returns the
+        number of URLs whose details were new or changed.
+        """
+        rows = {row[0]: row for row in (_scraped_details_row(m, source) for m in records)}
+        if not rows:
+            return 0
+        columns = SCRAPED_DETAILS_COLUMNS + ["content_hash"]
+        staged = pd.DataFrame([row + (_content_hash(row),) for row in rows.values()], columns=columns, dtype=object)
+
+        with self._staged(staged, "staged_scraped_details") as db:
+            changed = db.execute(f"""
+                INSERT INTO medicine_change_log (medicine_url, source, change, changed_fields, previous_hash, content_hash)
+                SELECT * FROM (
+                    SELECT s.medicine_url, s.source, CASE WHEN t.medicine_url IS NULL THEN 'new' ELSE 'changed' END AS change,
+                           CASE WHEN t.medicine_url IS NULL THEN NULL ELSE {_changed_fields_sql("s", "t")} END AS changed_fields,
+                           t.content_hash, s.content_hash
+                    FROM staged_scraped_details s
+                    LEFT JOIN medicine_scraped_details t ON t.medicine_url = s.medicine_url
+                    WHERE t.content_hash IS DISTINCT FROM s.content_hash
+                )
+                -- Rows stored before hashing existed have no hash; only log them if a value really moved
+                WHERE change = 'new' OR len(changed_fields) > 0
+                RETURNING medicine_url
+            """).fetchall()
+            db.execute(_upsert_sql("medicine_scraped_details", columns,
+                                   f"SELECT {', '.join('s.' + c for c in columns)} FROM staged_scraped_details s "
+                                   "LEFT JOIN medicine_scraped_details t ON t.medicine_url = s.medicine_url AND t.content_hash = s.content_hash "
+                                   "WHERE t.medicine_url IS NULL"))
+            db.execute("UPDATE medicine_details SET scraped = TRUE, claimed_by = NULL, lease_expires_at = NULL, last_error = NULL, "
+                       "next_due_at = NULL, updatedAt = current_localtimestamp() "
+                       "WHERE url IN (SELECT medicine_url FROM staged_scraped_details)")
+        return len(changed)
+
+
+    @contextmanager
+    def _staged(self, df, name):
+        """Register df as view `name` and run the body in one transaction."""
+        db = self._cursor()
+        db.register(name, df)
+        try:
+            db.execute("BEGIN TRANSACTION")
+            try:
+                yield db
+                db.execute("COMMIT")
+            except:
+                db.execute("ROLLBACK")
+                raise
+        finally:
+            db.unregister(name)
 
 
     def mark_brand_as_searched(self, brand_name, source):
-        db = duckdb.connect(self.dbpath)
-        db.execute("INSERT INTO brand_searches (brand_name, source, scraped) VALUES (?, ?, TRUE) ON CONFLICT DO UPDATE SET updatedAt = current_localtimestamp()", (brand_name.upper(), source))
+        db = self._cursor()
+        db.execute("INSERT INTO brand_searches (brand_name, source, scraped) VALUES (?, ?, TRUE) ON CONFLICT DO UPDATE SET scraped = TRUE, last_error = NULL, next_due_at = NULL, updatedAt = current_localtimestamp()", (brand_name.upper(), source))
+
+
+    def mark_brand_failed(self, brand_name, source, error):
+        """Record why searching `brand_name` failed; a brand searched earlier keeps its searched status."""
+        db = self._cursor()
+        db.execute("INSERT INTO brand_searches (brand_name, source, scraped, last_error) VALUES (?, ?, FALSE, ?) ON CONFLICT DO UPDATE SET last_error = EXCLUDED.last_error, updatedAt = current_localtimestamp()", (brand_name.upper(), source, error))
 
 
     def get_brand_search_status(self, brand_name, source):
-        db = duckdb.connect(self.dbpath)
+        db = self._cursor()
         res = db.execute("SELECT scraped FROM brand_searches WHERE brand_name = ? AND source = ?", (brand_name.upper(), source)).fetchone()
         return res[0] if res else False
 
 
     def get_brands(self, source=None):
-        db = duckdb.connect(self.dbpath)
+        db = self._cursor()
         query = """
             SELECT m.medicine_name, md.url, m.source
             FROM medicine_details md 
             JOIN medicines m ON md.url = m.url 
-            WHERE md.scraped = FALSE
+            WHERE md.scraped = FALSE AND NOT coalesce(md.failed, FALSE)
         """
+        params = []
         if source:
-            query += f" AND md.source = '{source}'"
-        return db.execute(query).df()
+            query += " AND md.source = ?"
+            params.append(source)
+        return db.execute(query, params).df()
 
 
     def clear_pending_brands(self, source=None):
-        db = duckdb.connect(self.dbpath)
+        db = self._cursor()
         where_clause = "WHERE scraped = FALSE"
+        params = []
         if source:
-            where_clause += f" AND source = '{source}'"
-        
-        db.execute(f"DELETE FROM medicines WHERE url IN (SELECT url FROM medicine_details {where_clause})")
-        db.execute(f"DELETE FROM medicine_details {where_clause}")
+            where_clause += " AND source = ?"
+            params.append(source)
+
+        db.execute(f"DELETE FROM medicines WHERE url IN (SELECT url FROM medicine_details {where_clause})", params)
+        db.execute(f"DELETE FROM medicine_details {where_clause}", params)
 
 
     def get_medicine_details(self, medicine_url):
-        db = duckdb.connect(self.dbpath)
+        db = self._cursor()
         return db.execute("SELECT * FROM medicine_details WHERE url = ?", (medicine_url,)).df()
 
 
     def update_scraped(self, medicine_url):
-        db = duckdb.connect(self.dbpath)
-        db.execute("UPDATE medicine_details SET scraped = TRUE, updatedAt = current_localtimestamp() WHERE url = ?", (medicine_url,))
+        db = self._cursor()
+        db.execute("UPDATE medicine_details SET scraped = TRUE, claimed_by = NULL, lease_expires_at = NULL, last_error = NULL, next_due_at = NULL, updatedAt = current_localtimestamp() WHERE url = ?", (medicine_url,))
+
+
+    def claim_pending(self, source, n, worker_id, lease_seconds=600, max_attempts=None):
+        """
+        Lease up to `n` pending URLs of `source` to `worker_id` and return them.
+
+        A URL is claimable while it is not scraped and has no unexpired lease, so
+        concurrent callers get disjoint batches and URLs of a worker that died are
+        handed out again once its lease runs out. Each claim counts as an attempt;
+        URLs with `max_attempts` or more, and permanently failed ones, are skipped.
+        Least-tried URLs go first.
+        The lease is cleared when the details are stored (update_scraped /
+        insert_scraped_details_bulk) or by release_claims().
+        """
+        query = """
+            UPDATE medicine_details
+            SET claimed_by = ?, lease_expires_at = current_localtimestamp() + to_seconds(?),
+                attempts = coalesce(attempts, 0) + 1, updatedAt = current_localtimestamp()
+            WHERE url IN (
+                SELECT url FROM medicine_details
+                WHERE scraped = FALSE AND NOT coalesce(failed, FALSE) AND source = ?
+                  AND (lease_expires_at IS NULL OR lease_expires_at < current_localtimestamp())
+                  AND (? IS NULL OR coalesce(attempts, 0) < ?)
+                ORDER BY coalesce(attempts, 0), created_at, url
+                LIMIT ?
+            )
+            RETURNING url
+        """
+        db = self._cursor()
+        # Claims from this process are serialised; a conflict can still come from a
+        # concurrent write transaction touching the same rows, so retry those
+        with self._claim_lock:
+            for attempt in range(5):
+                try:
+                    rows = db.execute(query, (worker_id, lease_seconds, source, max_attempts, max_attempts, n)).fetchall()
+                    return [row[0] for row in rows]
+                except duckdb.TransactionException:
+                    if attempt == 4:
+                        raise
+                    time.sleep(0.05 * (attempt + 1))
+
+
+    def record_failures(self, failures):
+        """
+        Store the error of each (url, error, permanent) in `failures`. Permanent
+        failures are taken out of the pending queue (get_brands/claim_pending)
+        until the URL is found by a search again.
+        """
+        if not failures:
+            return
+        db = self._cursor()
+        db.executemany("UPDATE medicine_details SET last_error = ?, failed = coalesce(failed, FALSE) OR ?, "
+                       "updatedAt = current_localtimestamp() WHERE url = ? AND scraped = FALSE",
+                       [(error, permanent, url) for url, error, permanent in failures])
+
+
+    def fail_exhausted(self, source, max_attempts):
+        """Mark unleased pending URLs that have used up `max_attempts` as permanently failed; returns how many."""
+        db = self._cursor()
+        rows = db.execute("UPDATE medicine_details SET failed = TRUE, "
+                          "last_error = coalesce(last_error, 'gave up after ' || attempts || ' attempts'), "
+                          "updatedAt = current_localtimestamp() "
+                          "WHERE source = ? AND scraped = FALSE AND NOT coalesce(failed, FALSE) AND attempts >= ? "
+                          "AND claimed_by IS NULL RETURNING url", (source, max_attempts)).fetchall()
+        return len(rows)
+
+
+    def get_failed(self, source=None):
+        db = self._cursor()
+        query = """
+            SELECT m.medicine_name, md.url, md.source, md.attempts, md.last_error, md.updatedAt
+            FROM medicine_details md
+            JOIN medicines m ON md.url = m.url
+            WHERE md.scraped = FALSE AND md.failed = TRUE
+        """
+        params = []
+        if source:
+            query += " AND md.source = ?"
+            params.append(source)
+        return db.execute(query, params).df()
+
+
+    def release_claims(self, worker_id, urls=None, refund=()):
+        """
+        Drop `worker_id`'s leases on unscraped URLs (all of them, or only `urls`) so they can be claimed again.
+        URLs in `refund` were claimed but never fetched (the circuit was open) and get back the attempt the claim counted.
+        """
+        db = self._cursor()
+        if refund:
+            db.execute("""
+                UPDATE medicine_details SET attempts = greatest(coalesce(attempts, 0) - 1, 0)
+                WHERE claimed_by = ? AND scraped = FALSE AND url IN (SELECT unnest(?::TEXT[]))
+            """, (worker_id, list(refund)))
+        query = "UPDATE medicine_details SET claimed_by = NULL, lease_expires_at = NULL WHERE claimed_by = ? AND scraped = FALSE"
+        params = [worker_id]
+        if urls is not None:
+            query += " AND url IN (SELECT unnest(?::TEXT[]))"
+            params.append(list(urls))
+        db.execute(query, params)
+
+
+    def extract_scraped_data(self, **filters):
+        """All scraped details, optionally narrowed by the filters of get_scraped_page()."""
+        db = self._cursor()
+        where, params = _scraped_filters(**filters)
+        return db.execute(f"SELECT * FROM medicine_scraped_details{where}", params).df()
+
+
+    def get_scraped_page(self, limit=100, offset=0, **filters):
+        """
+        One page of scraped details, newest first.
+
+        `filters` are search_text (case-insensitive substring of the name or
+        composition), sources, marketers (lists; empty means all) and generic
+        (True/False, None for all); they are applied in SQL, so only the page
+        is loaded.
+        """
+        db = self._cursor()
+        where, params = _scraped_filters(**filters)
+        return db.execute(f"SELECT * FROM medicine_scraped_details{where} "
+                          "ORDER BY updatedAt DESC, medicine_url LIMIT ? OFFSET ?", params + [limit, offset]).df()
+
+
+    def copy_scraped_data(self, path, fmt="csv", **filters):
+        """Write the filtered scraped details to `path` as CSV or Parquet with COPY; DuckDB streams them to disk."""
+        db = self._cursor()
+        where, params = _scraped_filters(**filters)
+        options = "FORMAT csv, HEADER" if fmt == "csv" else "FORMAT parquet"
+        path = path.replace("'", "''")
+        db.execute(f"COPY (SELECT * FROM medicine_scraped_details{where} ORDER BY updatedAt DESC, medicine_url) "
+                   f"TO '{path}' ({options})", params)
+
+
+    def iter_scraped_data(self, chunk_size=10000, **filters):
+        """Yield the column names, then the filtered scraped details in lists of up to `chunk_size` rows."""
+        db = self._cursor()
+        where, params = _scraped_filters(**filters)
+        result = db.execute(f"SELECT * FROM medicine_scraped_details{where} ORDER BY updatedAt DESC, medicine_url", params)
+        yield [column[0] for column in result.description]
+        while rows := result.fetchmany(chunk_size):
+            yield rows
+
+
+    def count_scraped(self, **filters):
+        db = self._cursor()
+        where, params = _scraped_filters(**filters)
+        return db.execute(f"SELECT count(*) FROM medicine_scraped_details{where}", params).fetchone()[0]
+
+
+    def get_scraped_sources(self):
+        db = self._cursor()
+        rows = db.execute("SELECT DISTINCT source FROM medicine_scraped_details WHERE source IS NOT NULL ORDER BY source").fetchall()
+        return [row[0] for row in rows]
+
+
+    def get_marketers(self):
+        db = self._cursor()
+        rows = db.execute("SELECT DISTINCT medicine_marketer FROM medicine_scraped_details "
+                          "WHERE medicine_marketer IS NOT NULL AND medicine_marketer <> '' ORDER BY 1").fetchall()
+        return [row[0] for row in rows]
+
+
+    def create_job(self, kind, source, total, params=None):
+        """Add a queued job and return its id."""
+        db = self._cursor()
+        return db.execute("INSERT INTO jobs (kind, source, total, params) VALUES (?, ?, ?, ?) RETURNING id",
+                          (kind, source, total, json.dumps(params) if params else None)).fetchone()[0]
+
+
+    def update_job_progress(self, job_id, done, failed, throughput):
+        db = self._cursor()
+        db.execute("UPDATE jobs SET done = ?, failed = ?, throughput = ?, updatedAt = current_localtimestamp() WHERE id = ?",
+                   (done, failed, throughput, job_id))
+
+
+    def set_job_status(self, job_id, status, error=None, only_from=None):
+        """
+        Move a job to `status`; 'running' stamps started_at, the final states stamp finished_at.
+        With `only_from` (a list of statuses) the job is only moved if it is in one of them.
+        Returns whether the job was updated.
+        """
+        db = self._cursor()
+        query = """
+            UPDATE jobs SET status = ?, error = coalesce(?, error),
+                started_at = CASE WHEN ? = 'running' THEN current_localtimestamp() ELSE started_at END,
+                finished_at = CASE WHEN ? IN ('done', 'failed', 'cancelled', 'interrupted') THEN current_localtimestamp() ELSE finished_at END,
+                updatedAt = current_localtimestamp()
+            WHERE id = ?
+        """
+        params = [status, error, status, status, job_id]
+        if only_from is not None:
+            query += " AND status IN (SELECT unnest(?::TEXT[]))"
+            params.append(list(only_from))
+        return bool(db.execute(query + " RETURNING id", params).fetchall())
+
+
+    def schedule_refreshes(self, table, source, ttl_seconds):
+        """
+        Give every row of `table` (brand_searches or medicine_details) for `source`
+        that was refreshed since it was last scheduled a next_due_at of
+        `ttl_seconds` after that refresh. Successful searches and detail scrapes
+        clear next_due_at, so this is where they are put back on the schedule.
+        Returns how many rows were scheduled.
+        """
+        db = self._cursor()
+        rows = db.execute(f"UPDATE {table} SET next_due_at = updatedAt + to_seconds(?) "
+                          "WHERE source = ? AND scraped AND next_due_at IS NULL RETURNING source",
+                          (ttl_seconds, source)).fetchall()
+        return len(rows)
+
+
+    def get_due_brands(self, source, ttl_seconds=None):
+        """
+        Brands of `source` due for a new search: (brand_name, seconds overdue, priority, last_error).
+        Seconds overdue is None for brands never searched successfully. Searches
+        not yet scheduled count as due `ttl_seconds` after they were done, so the
+        due list can be read without scheduling first. Read-only.
+        """
+        db = self._cursor()
+        return db.execute("""
+            WITH due AS (
+                SELECT *, CASE WHEN scraped AND next_due_at IS NULL THEN updatedAt + to_seconds(?)
+                               ELSE next_due_at END AS due_at
+                FROM brand_searches
+                WHERE source = ?
+            )
+            SELECT brand_name, epoch(current_localtimestamp() - due_at), coalesce(priority, 1.0), last_error
+            FROM due
+            WHERE due_at <= current_localtimestamp() OR (NOT scraped AND next_due_at IS NULL)
+        """, (ttl_seconds, source)).fetchall()
+
+
+    def get_known_brands(self, source):
+        """Every brand name `source` has a search record for, searched or not."""
+        db = self._cursor()
+        return [row[0] for row in db.execute("SELECT brand_name FROM brand_searches WHERE source = ?", (source,)).fetchall()]
+
+
+    def get_due_urls(self, source, ttl_seconds=None):
+        """
+        Scraped URLs of `source` whose details are due for a refresh: (url, seconds overdue, priority).
+        Scrapes not yet scheduled count as due `ttl_seconds` after they were done. Read-only.
+        """
+        db = self._cursor()
+        return db.execute("""
+            SELECT url, epoch(current_localtimestamp() - due_at), coalesce(priority, 1.0)
+            FROM (
+                SELECT url, priority, coalesce(next_due_at, updatedAt + to_seconds(?)) AS due_at
+                FROM medicine_details
+                WHERE source = ? AND scraped
+            )
+            WHERE due_at <= current_localtimestamp()
+        """, (ttl_seconds, source)).fetchall()
+
+
+    def requeue_urls(self, urls):
+        """Put scraped URLs back in the pending queue; they keep their next_due_at until scraped again."""
+        if not urls:
+            return
+        db = self._cursor()
+        db.execute("UPDATE medicine_details SET scraped = FALSE, attempts = 0, failed = FALSE, last_error = NULL, "
+                   "updatedAt = current_localtimestamp() WHERE url IN (SELECT unnest(?::TEXT[]))", (list(urls),))
+
+
+    def set_brand_priority(self, brand_names, source, priority):
+        """Weight `brand_names` in the refresh order of `source` (default 1.0); unknown brands are added as never searched."""
+        db = self._cursor()
+        db.executemany("INSERT INTO brand_searches (brand_name, source, scraped, priority) VALUES (?, ?, FALSE, ?) "
+                       "ON CONFLICT DO UPDATE SET priority = EXCLUDED.priority",
+                       [(brand_name.upper(), source, priority) for brand_name in brand_names])
+
+
+    def set_url_priority(self, urls, priority):
+        """Weight scraped `urls` in the detail refresh order (default 1.0); returns how many URLs were found."""
+        db = self._cursor()
+        rows = db.execute("UPDATE medicine_details SET priority = ? WHERE url IN (SELECT unnest(?::TEXT[])) RETURNING url",
+                          (priority, list(urls))).fetchall()
+        return len(rows)
+
+
+    def get_changes(self, since=None, after_id=None, source=None):
+        """
+        Entries of medicine_change_log, oldest first: products that were new or
+        whose details changed after `since` (a timestamp) or after change log id
+        `after_id` (keep the last id seen to read only new deltas).
+        """
+        db = self._cursor()
+        query = "SELECT * FROM medicine_change_log WHERE TRUE"
+        params = []
+        if since is not None:
+            query += " AND changed_at > ?"
+            params.append(since)
+        if after_id is not None:
+            query += " AND id > ?"
+            params.append(after_id)
+        if source:
+            query += " AND source = ?"
+            params.append(source)
+        return db.execute(query + " ORDER BY id", params).df()
+
+
+    def watermark(self, table):
+        """(row count, latest updatedAt) of `table`; it changes whenever rows are written or deleted."""
+        db = self._cursor()
+        return db.execute(f"SELECT count(*), max(updatedAt) FROM {table}").fetchone()
+
+
+    def get_jobs(self, limit=20):
+        """The most recent jobs, newest first."""
+        db = self._cursor()
+        return db.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).df()
+
+
+    def get_active_jobs(self):
+        db = self._cursor()
+        return db.execute("SELECT * FROM jobs WHERE status IN ('queued', 'running', 'cancelling') ORDER BY id").df()
 
 
-    def extract_scraped_data(self):
-        db = duckdb.connect(self.dbpath)
-        return db.execute("SELECT * FROM medicine_scraped_details").df()
+    def interrupt_jobs(self):
+        """Mark jobs left active by a process that is gone as interrupted; returns how many."""
+        db = self._cursor()
+        rows = db.execute("UPDATE jobs SET status = 'interrupted', finished_at = current_localtimestamp(), "
+                          "updatedAt = current_localtimestamp() "
+                          "WHERE status IN ('queued', 'running', 'cancelling') RETURNING id").fetchall()
+        return len(rows)
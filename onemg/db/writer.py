@@ -0,0 +1,176 @@
+import asyncio
+import itertools
+import logging
+import duckdb
+from contextlib import asynccontextmanager
+
+_STOP = object()
+
+# Attempts at a write that conflicts with another connection's transaction
+WRITE_ATTEMPTS = 5
+
+
+class AsyncDBWriter:
+    """
+    Write-behind buffer in front of Database.
+
+    Scrapers enqueue records with the put_* coroutines and carry on; a background
+    task coalesces them and writes them with the bulk Database methods from a
+    worker thread, so DuckDB never blocks the event loop. A batch is flushed when
+    `batch_size` records are buffered or `flush_interval_ms` has passed since the
+    first buffered record. The queue is bounded by `max_queue`: once it is full
+    the put_* calls wait, which slows producers down to the write rate.
+
+    Use it as an async context manager (or call start()/close()); close() writes
+    everything that was enqueued before it returns.
+    """
+
+    def __init__(self, dbase, batch_size=200, flush_interval_ms=500, max_queue=5000):
+        self.dbase = dbase
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_queue = max_queue
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self._queue = None
+        self._task = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Flush everything enqueued so far and stop the background task."""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        logging.info(f"DB writer closed: {self.written} records written in {self.flushes} flushes, {self.failed} failed")
+
+    async def put_medicine(self, medicine, source):
+        await self._put(("medicine", source, medicine))
+
+    async def put_medicines(self, medicines, source):
+        for medicine in medicines:
+            await self._put(("medicine", source, medicine))
+
+    async def put_scraped_details(self, medicine, source):
+        await self._put(("scraped_details", source, medicine))
+
+    async def put_scraped_details_many(self, medicines, source):
+        for medicine in medicines:
+            await self._put(("scraped_details", source, medicine))
+
+    async def put_brand_searched(self, brand_name, source):
+        await self._put(("brand_searched", source, brand_name))
+
+    async def put_detail_failure(self, url, error, source, permanent=False):
+        await self._put(("detail_failed", source, (url, error, permanent)))
+
+    async def put_brand_failure(self, brand_name, error, source):
+        await self._put(("brand_failed", source, (brand_name, error)))
+
+    async def _put(self, item):
+        if self._task is None:
+            raise RuntimeError("AsyncDBWriter is not running; call start() first")
+        await self._queue.put(item)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch = []
+        first_at = None
+        while True:
+            timeout = None if not batch else max(0.0, first_at + self.flush_interval - loop.time())
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                item = None
+
+            if item is _STOP:
+                await self._flush(batch)
+                return
+            if item is not None:
+                if not batch:
+                    first_at = loop.time()
+                batch.append(item)
+
+            if batch and (len(batch) >= self.batch_size or loop.time() - first_at >= self.flush_interval):
+                await self._flush(batch)
+                batch = []
+
+    async def _flush(self, batch):
+        if not batch:
+            return
+        # Apply consecutive runs of the same kind in enqueue order, so a re-queued URL
+        # (medicine insert) and its detail write keep their relative order.
+        for (kind, source), group in itertools.groupby(batch, key=lambda item: (item[0], item[1])):
+            await self._write_group(kind, source, [item[2] for item in group])
+        self.flushes += 1
+        logging.debug(f"DB writer flushed {len(batch)} records")
+
+    async def _write_group(self, kind, source, records):
+        """
+        Write `records`, retrying conflicts with other connections' transactions.
+        A group that fails for any other reason is split in half and each half
+        written on its own, so one bad record does not lose the rest of the group.
+        """
+        for attempt in range(WRITE_ATTEMPTS):
+            try:
+                await asyncio.to_thread(self._write, kind, source, records)
+                self.written += len(records)
+                return
+            except duckdb.TransactionException as e:
+                # Another job's write touched the same rows; the bulk writes roll back
+                # as a whole and are idempotent, so back off and write the group again
+                if attempt < WRITE_ATTEMPTS - 1:
+                    logging.warning(f"DB writer conflict writing {len(records)} {kind} records for {source}, retrying: {e}")
+                    await asyncio.sleep(0.05 * (attempt + 1))
+                    continue
+                self.failed += len(records)
+                logging.error(f"DB writer failed to write {len(records)} {kind} records for {source} "
+                              f"after {WRITE_ATTEMPTS} attempts: {e}")
+                return
+            except Exception as e:
+                if len(records) > 1:
+                    middle = len(records) // 2
+                    await self._write_group(kind, source, records[:middle])
+                    await self._write_group(kind, source, records[middle:])
+                else:
+                    self.failed += 1
+                    logging.error(f"DB writer failed to write {kind} record for {source}: {e} ({records[0]!r:.200})")
+                return
+
+    def _write(self, kind, source, records):
+        if kind == "medicine":
+            self.dbase.insert_medicines_bulk(records, source)
+        elif kind == "scraped_details":
+            self.dbase.insert_scraped_details_bulk(records, source)
+        elif kind == "brand_searched":
+            for brand_name in records:
+                self.dbase.mark_brand_as_searched(brand_name, source)
+        elif kind == "detail_failed":
+            self.dbase.record_failures(records)
+        elif kind == "brand_failed":
+            for brand_name, error in records:
+                self.dbase.mark_brand_failed(brand_name, source, error)
+
+
+@asynccontextmanager
+async def use_writer(writer=None, dbase=None):
+    """Yield `writer`, or a writer on `dbase` that is closed on exit if there is none."""
+    if writer is not None:
+        yield writer
+    else:
+        async with AsyncDBWriter(dbase) as writer:
+            yield writer
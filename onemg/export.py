@@ -0,0 +1,88 @@
+"""
+On-demand exports of the scraped details.
+
+CSV and Parquet are written by DuckDB's COPY straight to a file. Excel is
+built from the query in chunks with openpyxl's write-only workbook, so memory
+stays flat whatever the table size; above Excel's sheet row limit it is not
+offered and CSV/Parquet should be used instead.
+
+Temporary files are removed with discard_export() once they are downloaded,
+and any still around when the process exits are removed then.
+"""
+import atexit
+import os
+import tempfile
+import threading
+from openpyxl import Workbook
+
+# One sheet holds 1,048,576 rows including the header
+EXCEL_MAX_ROWS = 1048575
+
+FORMATS = {
+    "csv": {"label": "CSV", "extension": "csv", "mime": "text/csv"},
+    "parquet": {"label": "Parquet", "extension": "parquet", "mime": "application/vnd.apache.parquet"},
+    "excel": {"label": "Excel", "extension": "xlsx",
+              "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+}
+
+
+# Temporary export files created by this process and not yet discarded
+_temp_files = set()
+_temp_lock = threading.Lock()
+
+
+class ExportTooLargeError(Exception):
+    """The rows do not fit in the requested format."""
+
+
+def _write_excel(dbase, path, chunk_size, filters):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("scraped_data")
+    chunks = dbase.iter_scraped_data(chunk_size=chunk_size, **filters)
+    sheet.append(next(chunks))
+    for rows in chunks:
+        for row in rows:
+            sheet.append(row)
+    workbook.save(path)
+
+
+def export_scraped_data(dbase, fmt, path=None, chunk_size=10000, **filters):
+    """
+    Write the scraped details matching `filters` (see Database.get_scraped_page)
+    to `path`, or to a new temporary file, as "csv", "parquet" or "excel".
+    Returns the path. Raises ExportTooLargeError for Excel above EXCEL_MAX_ROWS.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt == "excel" and dbase.count_scraped(**filters) > EXCEL_MAX_ROWS:
+        raise ExportTooLargeError(f"More than {EXCEL_MAX_ROWS} rows do not fit in an Excel sheet; export CSV or Parquet instead")
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix="scraped_data_", suffix=f".{FORMATS[fmt]['extension']}")
+        os.close(fd)
+        with _temp_lock:
+            _temp_files.add(path)
+    if fmt == "excel":
+        _write_excel(dbase, path, chunk_size, filters)
+    else:
+        dbase.copy_scraped_data(path, fmt, **filters)
+    return path
+
+
+def discard_export(path):
+    """Delete an export file made by export_scraped_data(); a file that is already gone is ignored."""
+    with _temp_lock:
+        _temp_files.discard(path)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _discard_all():
+    with _temp_lock:
+        paths = list(_temp_files)
+    for path in paths:
+        discard_export(path)
+
+
+atexit.register(_discard_all)
@@ -0,0 +1,100 @@
+"""
+Search every source for a brand list at once.
+
+Each source runs its own search_many on one event loop with its own concurrency
+budget (a slow or failing source never holds the others back), and all of them
+write through one shared AsyncDBWriter, so results reach the database as each
+search finishes rather than after a whole pass.
+
+Usage: python fanout.py [--sources 1MG PlatinumRx TrueMeds] [--limit 20]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from db.db import Database
+from db.writer import AsyncDBWriter
+from logconfig import setup_logging
+import onemg_scraper_v2
+import platinumrx_scraper
+import truemeds_scraper
+
+SEARCH_MANY = {
+    "1MG": onemg_scraper_v2.search_many,
+    "PlatinumRx": platinumrx_scraper.search_many,
+    "TrueMeds": truemeds_scraper.search_many,
+}
+
+# 1mg searches each hold a browser page; the other two are plain API calls
+DEFAULT_CONCURRENCY = {
+    "1MG": 4,
+    "PlatinumRx": 8,
+    "TrueMeds": 8,
+}
+
+
+async def search_all(brands, sources=None, max_products=15, headless=True, dbase=None, concurrency=None,
+                     on_progress=None):
+    """
+    Search `sources` (default: all of them) for every name in `brands` concurrently.
+    `brands` may also map each source to its own list of names.
+
+    `concurrency` maps a source to its number of searches in flight and overrides
+    DEFAULT_CONCURRENCY. `on_progress(source, done, failed, total)` is called after
+    every brand of every source. Returns {source: {"done", "failed"}}; a source
+    that fails as a whole is logged and reported with all its brands failed.
+    """
+    sources = list(sources or SEARCH_MANY)
+    budgets = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+    source_brands = brands if isinstance(brands, dict) else {source: brands for source in sources}
+    total = sum(len(source_brands.get(source, [])) for source in sources)
+    start = time.monotonic()
+
+    async with AsyncDBWriter(dbase) as writer:
+
+        async def run(source):
+            progress = (lambda done, failed, n: on_progress(source, done, failed, n)) if on_progress else None
+            try:
+                return await SEARCH_MANY[source](source_brands.get(source, []), max_products=max_products, headless=headless, dbase=dbase,
+                                                 concurrency=budgets[source], on_progress=progress, writer=writer)
+            except Exception as e:
+                logging.error(f"{source} search pass failed: {e}")
+                return {"done": 0, "failed": len(source_brands.get(source, []))}
+
+        results = await asyncio.gather(*(run(source) for source in sources))
+
+    stats = dict(zip(sources, results))
+    elapsed = time.monotonic() - start
+    logging.info(f"Fan-out search of {total} brand searches across {len(sources)} sources finished in {elapsed:.1f}s: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search all sources for the brands in brands_to_fetch.txt at once.")
+    parser.add_argument("--sources", nargs="+", choices=list(SEARCH_MANY), default=list(SEARCH_MANY),
+                        help="Sources to search (default: all)")
+    parser.add_argument("--limit", type=int, default=15, help="Limit the number of products per search")
+    parser.add_argument("--headless", action="store_true", default=True, help="Run in headless mode")
+    parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    for name, default in DEFAULT_CONCURRENCY.items():
+        parser.add_argument(f"--{name.lower()}_concurrency", type=int, default=default,
+                            help=f"Number of {name} searches run in parallel")
+
+    args = parser.parse_args()
+
+    log_level = logging.DEBUG if args.debug else logging.INFO
+    setup_logging(log_level)
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    dbase = Database(dbpath=os.path.join(script_dir, 'db', 'db.duckdb'))
+    dbase.init()
+
+    with open(os.path.join(script_dir, 'brands_to_fetch.txt'), 'r') as f:
+        brands = [brand for brand in f.read().splitlines() if brand.strip()]
+
+    concurrency = {name: getattr(args, f"{name.lower()}_concurrency") for name in DEFAULT_CONCURRENCY}
+    asyncio.run(search_all(brands, sources=args.sources, max_products=args.limit, headless=args.headless,
+                           dbase=dbase, concurrency=concurrency))
+
+    dbase.close()
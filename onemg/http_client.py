@@ -0,0 +1,79 @@
+import asyncio
+from contextlib import asynccontextmanager
+import httpx
+
+BROWSER_HEADERS = {
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "accept-language": "en-GB,en;q=0.9",
+    # httpx decodes gzip/deflate itself and br through the brotli package
+    "accept-encoding": "gzip, deflate, br",
+}
+
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+
+# Maximum concurrent requests per host; hosts not listed get `per_host`
+HOST_LIMITS = {
+    "www.1mg.com": 8,
+    "backend.platinumrx.in": 8,
+    "nal.tmmumbai.in": 8,
+}
+
+
+class HttpClient:
+    """
+    Async HTTP client shared by all sources.
+
+    Wraps one httpx.AsyncClient, so connections (and their TLS sessions) are kept
+    alive and reused across requests, and caps the number of concurrent requests
+    per host on top of the pool-wide connection limit. Use it as an async context
+    manager; it must be used from a single event loop.
+    """
+
+    def __init__(self, max_connections=50, per_host=8, host_limits=None, timeout=DEFAULT_TIMEOUT):
+        self.per_host = per_host
+        self.host_limits = {**HOST_LIMITS, **(host_limits or {})}
+        self._semaphores = {}
+        self._client = httpx.AsyncClient(
+            headers=BROWSER_HEADERS,
+            follow_redirects=True,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                keepalive_expiry=30.0),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def request(self, method, url, **kwargs):
+        host = httpx.URL(url).host
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(self.host_limits.get(host, self.per_host))
+        async with semaphore:
+            return await self._client.request(method, url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+
+def new_client(max_connections=50, per_host=8, host_limits=None):
+    return HttpClient(max_connections=max_connections, per_host=per_host, host_limits=host_limits)
+
+
+@asynccontextmanager
+async def use_client(client=None):
+    """Yield `client`, or a short-lived client if there is none."""
+    if client is not None:
+        yield client
+    else:
+        async with new_client() as client:
+            yield client
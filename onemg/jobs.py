@@ -0,0 +1,121 @@
+"""
+Background job runner for the Streamlit app.
+
+Streamlit runs the script in a thread per session and stops it on every rerun,
+so a scrape started with asyncio.run() froze the page and died with a browser
+refresh. JobRunner owns one event-loop thread for the whole server process
+(create it once with st.cache_resource); the app submits scrapes to it and
+returns immediately. Each job has a row in the `jobs` table with its status,
+progress counters and throughput, which the UI polls, and can be cancelled
+from any session. Only one job of a kind runs per source at a time.
+"""
+import asyncio
+import logging
+import threading
+import time
+
+ACTIVE = ("queued", "running", "cancelling")
+
+
+class JobConflictError(Exception):
+    """A job of the same kind is already running for the source."""
+
+
+class JobRunner:
+    """
+    Runs scrape coroutines on a dedicated event loop in a daemon thread.
+
+    Jobs left active in the database by a previous server process are marked
+    interrupted when the runner starts.
+    """
+
+    def __init__(self, dbase, progress_interval=1.0):
+        self.dbase = dbase
+        self.progress_interval = progress_interval
+        self._loop = asyncio.new_event_loop()
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="job-runner", daemon=True)
+        self._thread.start()
+        interrupted = dbase.interrupt_jobs()
+        if interrupted:
+            logging.warning(f"Marked {interrupted} jobs of a previous run as interrupted")
+
+    def submit(self, kind, source, total, make_coro, params=None):
+        """
+        Start a job and return its id.
+
+        `make_coro(on_progress)` must return the coroutine to run; it reports
+        progress by calling `on_progress(done, failed)`. `source` is a source
+        name or "ALL" for a job that covers every source. Raises
+        JobConflictError while another job of the same `kind` is active for an
+        overlapping source.
+        """
+        with self._lock:
+            active = self.dbase.get_active_jobs()
+            overlapping = active[(active["kind"] == kind) &
+                                 ((active["source"] == source) | (active["source"] == "ALL") | (source == "ALL"))]
+            if not overlapping.empty:
+                job = overlapping.iloc[0]
+                raise JobConflictError(f"Job #{job['id']} ({job['kind']} on {job['source']}) is still {job['status']}")
+            job_id = self.dbase.create_job(kind, source, total, params)
+            future = asyncio.run_coroutine_threadsafe(self._run(job_id, total, make_coro), self._loop)
+            self._tasks[job_id] = future
+        logging.info(f"Job #{job_id} submitted: {kind} on {source} ({total} items)")
+        return job_id
+
+    def cancel(self, job_id):
+        """Ask a running job to stop; returns False if it is not running in this process."""
+        future = self._tasks.get(job_id)
+        if future is None or future.done():
+            return False
+        # The job may finish between the check above and this write; never move a finished job back
+        if not self.dbase.set_job_status(job_id, "cancelling", only_from=("queued", "running")):
+            return False
+        future.cancel()
+        return True
+
+    def is_running(self, job_id):
+        future = self._tasks.get(job_id)
+        return future is not None and not future.done()
+
+    async def _run(self, job_id, total, make_coro):
+        start = last_report = time.monotonic()
+        counts = {"done": 0, "failed": 0}
+
+        def report():
+            elapsed = time.monotonic() - start
+            throughput = (counts["done"] + counts["failed"]) / elapsed if elapsed else 0.0
+            try:
+                self.dbase.update_job_progress(job_id, counts["done"], counts["failed"], throughput)
+            except Exception as e:
+                # Progress is only for display; a failed write must not abort the scrape calling on_progress
+                logging.warning(f"Job #{job_id}: could not record progress: {e}")
+
+        def on_progress(done, failed):
+            nonlocal last_report
+            counts.update(done=done, failed=failed)
+            now = time.monotonic()
+            if now - last_report >= self.progress_interval or done + failed >= total:
+                last_report = now
+                report()
+
+        self.dbase.set_job_status(job_id, "running")
+        try:
+            await make_coro(on_progress)
+        except asyncio.CancelledError:
+            report()
+            self.dbase.set_job_status(job_id, "cancelled")
+            logging.info(f"Job #{job_id} cancelled after {counts['done'] + counts['failed']}/{total} items")
+            raise
+        except Exception as e:
+            report()
+            self.dbase.set_job_status(job_id, "failed", error=str(e))
+            logging.exception(f"Job #{job_id} failed: {e}")
+        else:
+            report()
+            self.dbase.set_job_status(job_id, "done")
+            logging.info(f"Job #{job_id} finished: {counts['done']} done, {counts['failed']} failed "
+                         f"in {time.monotonic() - start:.1f}s")
+        finally:
+            self._tasks.pop(job_id, None)
@@ -0,0 +1,82 @@
+"""
+Incremental tail of a growing log file for the Streamlit log viewer.
+
+The viewer refreshes every 2 seconds; reading the whole file each time made
+its cost grow with the log. LogTail remembers how far it has read, seeks
+there and reads only what was appended since, keeping the most recent lines
+in a ring buffer that the viewer filters. The first read starts near the end
+of the file, so a large existing log is never read in full.
+"""
+import os
+import threading
+from collections import deque
+
+ERROR_MARKERS = ("ERROR", "CRITICAL", "EXCEPTION", "FAILED")
+
+
+class LogTail:
+    """
+    Keeps the last `max_lines` lines of `path`.
+
+    poll() reads the bytes appended since the previous call. A file that got
+    shorter (cleared) empties the buffer and is read from the start; a file that
+    was replaced (rotated) is read from the start while the lines already
+    buffered are kept. Safe to share between threads.
+    """
+
+    def __init__(self, path, max_lines=5000, initial_bytes=2 ** 20, chunk_size=2 ** 20):
+        self.path = path
+        self.initial_bytes = initial_bytes
+        self.chunk_size = chunk_size
+        self.lines = deque(maxlen=max_lines)
+        self._offset = None
+        self._inode = None
+        self._partial = b""
+        self._skip_partial = False
+        self._lock = threading.Lock()
+
+    def poll(self):
+        """Read whatever was appended since the last poll; returns the number of new lines."""
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return 0
+
+            if self._offset is None:
+                self._offset = max(0, stat.st_size - self.initial_bytes)
+                self._skip_partial = self._offset > 0
+            elif stat.st_ino != self._inode:
+                self._offset, self._partial, self._skip_partial = 0, b"", False
+            elif stat.st_size < self._offset:
+                self.lines.clear()
+                self._offset, self._partial, self._skip_partial = 0, b"", False
+            self._inode = stat.st_ino
+
+            if stat.st_size == self._offset:
+                return 0
+            added = 0
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                while chunk := f.read(self.chunk_size):
+                    self._offset += len(chunk)
+                    data = self._partial + chunk
+                    *complete, self._partial = data.split(b"\n")
+                    if self._skip_partial and complete:
+                        # Started mid-file: the first line is probably cut off
+                        complete = complete[1:]
+                        self._skip_partial = False
+                    self.lines.extend(line.decode("utf-8", errors="replace").rstrip("\r") for line in complete)
+                    added += len(complete)
+            return added
+
+    def search(self, text=None, errors_only=False, limit=500):
+        """The last `limit` buffered lines containing `text` (case-insensitive) and, if `errors_only`, an error marker."""
+        with self._lock:
+            lines = list(self.lines)
+        if errors_only:
+            lines = [line for line in lines if any(marker in line.upper() for marker in ERROR_MARKERS)]
+        if text:
+            text = text.lower()
+            lines = [line for line in lines if text in line.lower()]
+        return lines[-limit:]
@@ -0,0 +1,135 @@
+"""
+Non-blocking logging setup for the scrapers and the app.
+
+Handlers that write to a file or the console block the thread that logs, which
+for the scrapers is the event loop. setup_logging() gives the root logger a
+single queue handler instead: records are put on an in-memory queue and a
+listener thread formats them and writes them to the console and a
+size-rotated log file. Messages are formatted on the listener thread, so
+hot-path debug calls should pass their values as %-style arguments (wrap
+payloads that need json.dumps in LazyJson) rather than build f-strings.
+
+DEBUG records are rate limited per call site (file and line) so a per-item
+debug message cannot flood the queue; the next record let through from a
+throttled call site says how many were dropped.
+"""
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener = None
+_config = None
+_lock = threading.RLock()
+
+
+class LazyJson:
+    """Defers json.dumps(value) until a log record is actually written."""
+
+    def __init__(self, value, **kwargs):
+        self.value = value
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return json.dumps(self.value, **self.kwargs)
+
+
+class DebugRateLimit(logging.Filter):
+    """Lets through at most `burst` DEBUG records per call site every `interval` seconds."""
+
+    def __init__(self, burst=20, interval=1.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window_start, count, dropped = self._sites.get(site, (now, 0, 0))
+            if now - window_start >= self.interval:
+                window_start, count = now, 0
+            if count >= self.burst:
+                self._sites[site] = (window_start, count, dropped + 1)
+                return False
+            self._sites[site] = (window_start, count + 1, 0)
+        if dropped:
+            record.msg = f"{record.msg} [{dropped} similar messages suppressed]"
+        return True
+
+
+class _DeferredQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # QueueHandler formats the message here, on the logging thread; leave that to
+        # the listener. The record stays in this process, so its args need not be pickled.
+        return record
+
+
+def setup_logging(level=logging.INFO, log_file=None, fmt=LOG_FORMAT, stream=None, max_bytes=10 * 2 ** 20,
+                  backup_count=3, debug_burst=20, debug_interval=1.0):
+    """
+    Route all logging through a queue to a listener thread writing to `stream`
+    (default stderr) and, if given, `log_file`, rotated at `max_bytes` with
+    `backup_count` old files kept.
+
+    Safe to call repeatedly (the app calls it on every rerun): with the same
+    settings only the level is updated, otherwise the handlers are rebuilt.
+    Returns True if anything changed.
+    """
+    global _listener, _config
+    root = logging.getLogger()
+    level_changed = root.level != level
+    root.setLevel(level)
+    config = (log_file, fmt, stream, max_bytes, backup_count, debug_burst, debug_interval)
+    with _lock:
+        if _listener is not None and config == _config:
+            return level_changed
+        stop_logging()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+            handler.close()
+
+        formatter = logging.Formatter(fmt)
+        handlers = [logging.StreamHandler(stream or sys.stderr)]
+        if log_file:
+            handlers.append(RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        records = queue.SimpleQueue()
+        queue_handler = _DeferredQueueHandler(records)
+        queue_handler.addFilter(DebugRateLimit(debug_burst, debug_interval))
+        root.addHandler(queue_handler)
+        _listener = QueueListener(records, *handlers)
+        _listener.start()
+        _config = config
+    return True
+
+
+def stop_logging():
+    """Write out everything still queued, then detach and close the handlers (e.g. before clearing the log file)."""
+    global _listener, _config
+    with _lock:
+        if _listener is None:
+            return
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            if isinstance(handler, _DeferredQueueHandler):
+                root.removeHandler(handler)
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = _config = None
+
+
+atexit.register(stop_logging)
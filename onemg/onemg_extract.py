@@ -0,0 +1,267 @@
+"""
+Field extraction for 1mg pages.
+
+Each page type is read with a single in-page script that walks the DOM and
+returns every raw text/href the scraper needs as one JSON object, instead of a
+count()/inner_text() round trip per field. The scripts keep the selectors (and
+their fallbacks) the scraper has always used; the parse_* functions turn the
+raw object into the result dicts stored by Database.
+"""
+import logging
+import re
+
+
+def extract_price(text):
+    if not text:
+        return None
+    cleaned = re.sub(r"[,\s₹]", "", text)
+    match = re.search(r"[\d.]+", cleaned)
+    return float(match.group()) if match else None
+
+
+def extract_discount(text):
+    if not text:
+        return None
+    match = re.search(r"(\d+)%", text)
+    return int(match.group(1)) if match else None
+
+
+def extract_medicine_id(url):
+    if not url:
+        return None
+    # match = re.search(r"/drugs/[\w-]+-(\d+)", url)
+    match = re.search(r"(\d+)$", url)
+    return match.group(1) if match else None
+
+
+# Helpers shared by the page scripts. findText() mirrors Playwright's `text=` selector:
+# the first (in document order) smallest element whose normalised text matches.
+_JS_HELPERS = r"""
+    const norm = (s) => (s || "").replace(/\s+/g, " ").trim();
+    const text = (el) => el ? el.innerText.trim() : null;
+    const first = (root, sel) => root ? root.querySelector(sel) : null;
+    const findText = (root, test) => {
+        if (!root) return null;
+        const matches = (el) => test(norm(el.textContent));
+        for (const el of root.querySelectorAll("*")) {
+            if (["SCRIPT", "STYLE", "NOSCRIPT"].includes(el.tagName)) continue;
+            if (matches(el) && !Array.from(el.children).some(matches)) return el;
+        }
+        return null;
+    };
+    const contains = (needle) => (s) => s.toLowerCase().includes(needle.toLowerCase());
+"""
+
+SEARCH_TILES_JS = "() => {" + _JS_HELPERS + r"""
+    return Array.from(document.querySelectorAll('[class*="VerticalProductTile__container"]')).map((card) => {
+        const header = first(card, '[class*="VerticalProductTile__header"]');
+        const link = header ? header.closest("a") : null;
+        const parentText = (needle) => {
+            const el = findText(card, contains(needle));
+            return el && el.parentElement ? text(el.parentElement) : null;
+        };
+        return {
+            href: link ? link.getAttribute("href") : null,
+            name: text(header),
+            card_text: card.innerText,
+            selling_price_text: parentText("Discounted Price"),
+            mrp_text: parentText("Original Price"),
+            discount_text: parentText("Discount Percentage"),
+            in_stock: findText(card, contains("Add to cart")) !== null,
+        };
+    });
+}"""
+
+PRODUCT_DETAIL_JS = "() => {" + _JS_HELPERS + r"""
+    const storageEls = document.querySelectorAll('div[class*="saltInfo DrugHeader__meta-value"]');
+    let storage = storageEls.length ? storageEls[storageEls.length - 1] : null;
+    if (!storage) {
+        const label = findText(document.body, (s) => /Storage/i.test(s));
+        storage = label ? label.nextElementSibling : null;
+    }
+
+    const substitutes = [];
+    const subSection = first(document, 'div[class*="SubstituteList__container"]');
+    if (subSection) {
+        for (const card of subSection.querySelectorAll('div[class*="SubstituteItem__item"]')) {
+            const link = first(card, "a");
+            substitutes.push({
+                name: text(first(card, 'div[class*="SubstituteItem__name"]')),
+                href: link ? link.getAttribute("href") : null,
+                price_text: text(first(card, 'div[class*="SubstituteItem__unit-price"]')),
+                save_text: text(first(card, 'div[class*="SubstituteItem__save-text"]')),
+            });
+        }
+    }
+
+    let generic = null;
+    const genericContainer = first(document, 'div[class*="InStockRxSubstitution__rightSku"]')
+        || first(document, 'div[class*="OOSRxSubstitution__skuCard"]');
+    if (genericContainer) {
+        const link = first(genericContainer, 'a[href*="/drugs/"]');
+        generic = {
+            href: link ? link.getAttribute("href") : null,
+            price_text: text(findText(genericContainer, (s) => /₹\s*[\d,]+/.test(s))),
+            by_text: text(findText(genericContainer, (s) => /^by /i.test(s))),
+            contains_text: text(findText(genericContainer, (s) => /[A-Z][a-z]+.*\([\d.]+\s*[mgu]+\)/.test(s))),
+            contains_backup_text: text(first(document, 'div[class*="OOSRxSubstitution__saltComposition"]')),
+        };
+    }
+
+    return {
+        name: text(first(document, 'h1[class*="DrugHeader__title"]')),
+        composition: text(first(document, 'div[class*="saltInfo"]')),
+        marketer: text(first(document, 'div[class*="DrugHeader__meta-value"]')),
+        storage: text(storage),
+        mrp_text: text(first(document, 'span[class*="DrugPriceBox__slashed-price"]')),
+        price_text: text(first(document, 'div[class*="DrugPriceBox__best-price___32JXw"]')),
+        price_backup_text: text(first(document,
+            'div[class*="DrugPriceBox__mrp-wrapper___2o5TZ"] div[class*="DrugPriceBox__price___dj2lv"]')),
+        discount_text: text(first(document, 'span[class*="DrugPriceBox__slashed-percent"]')),
+        pack: text(first(document, 'div[class*="DrugPriceBox__quantity"]')),
+        substitutes: substitutes,
+        generic: generic,
+    };
+}"""
+
+
+def _absolute(href):
+    return f"https://www.1mg.com{href}" if href and href.startswith("/") else href
+
+
+def parse_search_tiles(tiles, max_products=10):
+    """Turn the raw tiles returned by SEARCH_TILES_JS into search results."""
+    results = []
+    for tile in tiles:
+        if len(results) >= max_products:
+            break
+
+        try:
+            href = tile.get("href")
+            link = f"https://www.1mg.com{href}" if href else ""
+            name = tile.get("name")
+
+            # Pack size - look in the text for strip of X
+            card_text = tile.get("card_text") or ""
+            pack_match = re.search(
+                r"strip of (\d+ [\w]+)|(\d+ [\w]+) in (strip|tablet|capsule)",
+                card_text,
+                re.IGNORECASE,
+            )
+            pack_size = pack_match.group() if pack_match else None
+
+            # If no pack found, try other pattern
+            if not pack_size:
+                pack_match = re.search(r"of (\d+\s*\w+)", card_text, re.IGNORECASE)
+                pack_size = pack_match.group() if pack_match else None
+
+            logging.debug("Processing card: %s | Pack: %s", name, pack_size)
+
+            selling_price = None
+            if tile.get("selling_price_text"):
+                price_match = re.search(r"₹?([\d.]+)", tile["selling_price_text"])
+                selling_price = float(price_match.group(1)) if price_match else None
+
+            mrp = None
+            if tile.get("mrp_text"):
+                price_match = re.search(r"₹?([\d.]+)", tile["mrp_text"])
+                mrp = float(price_match.group(1)) if price_match else None
+
+            discount_pct = extract_discount(tile.get("discount_text"))
+            in_stock = bool(tile.get("in_stock"))
+
+            result = {
+                "medicine_name": name,
+                "medicine_url": link,
+                "medicine_id": extract_medicine_id(link),
+                "mrp": mrp,
+                "selling_price": selling_price,
+                "discount_percentage": discount_pct,
+                "expected_delivery_date": None,
+                "in_stock": in_stock,
+                "stock_status": "In Stock" if in_stock else "Out of Stock",
+                "pack_size_quantity": pack_size,
+            }
+
+            if result["medicine_name"] and result["selling_price"]:
+                results.append(result)
+                logging.debug("  [OK] %.45s | Rs.%s | %s%% off", result['medicine_name'], result['selling_price'],
+                              result['discount_percentage'])
+
+        except Exception as e:
+            logging.error(f"  [Error] {str(e)[:60]}")
+            continue
+
+    return results
+
+
+def check_product_detail(result):
+    """
+    Raise RuntimeError if a parsed product detail has neither a name nor a
+    selling price: the page did not render (or was not a product page), and
+    storing it would overwrite good details with an empty row.
+    """
+    if result.get("medicine_name") is None and result.get("medicine_selling_price") is None:
+        raise RuntimeError("Incomplete product details (no name and no selling price)")
+
+
+def parse_product_detail(raw):
+    """Turn the raw object returned by PRODUCT_DETAIL_JS into a product detail result."""
+    result = {
+        "medicine_name": raw.get("name"),
+        "medicine_composition": raw.get("composition"),
+        "medicine_marketer": raw.get("marketer"),
+        "medicine_storage": raw.get("storage"),
+        "medicine_mrp": extract_price(raw.get("mrp_text")),
+        "medicine_selling_price": extract_price(raw.get("price_text")),
+    }
+    if result["medicine_selling_price"] is None:
+        result["medicine_selling_price"] = extract_price(raw.get("price_backup_text"))
+    result["medicine_discount"] = extract_discount(raw.get("discount_text"))
+    result["pack_size_information"] = raw.get("pack")
+
+    result["substitutes"] = []
+    for sub in raw.get("substitutes") or []:
+        sub_url = f"https://www.1mg.com{sub['href']}" if sub.get("href") else None
+        if sub.get("name") and sub_url:
+            result["substitutes"].append(
+                {
+                    "substitute_name": sub["name"],
+                    "url": sub_url,
+                    "price_per_unit": extract_price(sub.get("price_text")),
+                    "cheaper_percentage": sub.get("save_text"),
+                }
+            )
+    logging.debug("  Found %d substitutes", len(result['substitutes']))
+
+    result["generic_alternative_available"] = False
+    result["generic_alternative"] = None
+    generic = raw.get("generic")
+    if generic:
+        result["generic_alternative_available"] = True
+        logging.info("Generic alternative found.")
+
+        gen_url = _absolute(generic.get("href"))
+
+        # Get the product name - extract from URL (most reliable method)
+        gen_name = None
+        if gen_url:
+            # URL pattern: /drugs/durite-5-tablet-737465 -> Durite 5 Tablet
+            match = re.search(r"/drugs/([\w-]+)-(\d+)$", gen_url)
+            if match:
+                gen_name = " ".join(word.capitalize() for word in match.group(1).split("-"))
+
+        gen_by = None
+        by_text = generic.get("by_text")
+        if by_text and by_text.lower().startswith("by "):
+            gen_by = by_text[3:].strip()
+
+        result["generic_alternative"] = {
+            "alternate_name": gen_name,
+            "url": gen_url,
+            "price": extract_price(generic.get("price_text")),
+            "by_who": gen_by,
+            "contains_what": generic.get("contains_text") or generic.get("contains_backup_text"),
+        }
+
+    return result
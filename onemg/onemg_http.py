@@ -0,0 +1,298 @@
+"""
+Browser-free fast path for 1mg product pages.
+
+1mg product pages are server-rendered, so the fields the scraper reads are
+already in the HTML returned by a plain GET. This module parses that HTML with
+the same class selectors (and fallbacks) as PRODUCT_DETAIL_JS, fills gaps from
+the page's schema.org JSON-LD block, and produces the same result dict as
+scrape_1mg_product_detail. A page that does not validate returns None so the
+caller can render it in Chromium instead. Failed requests are not rendered:
+throttling and server errors are retried through 1mg's circuit breaker like
+every other request, and a missing page raises PermanentError.
+"""
+import asyncio
+import json
+import logging
+import re
+from html.parser import HTMLParser
+from http_client import use_client
+from ratelimit import get_limiter
+from resilience import with_retries, raise_for_status
+from onemg_extract import extract_price, parse_product_detail
+
+# Fields a fast-path result must have; anything less falls back to the browser
+REQUIRED_FIELDS = ("medicine_name", "medicine_selling_price", "medicine_composition")
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+BLOCK_TAGS = {"address", "article", "aside", "blockquote", "dd", "div", "dl", "dt", "footer", "form", "h1", "h2",
+              "h3", "h4", "h5", "h6", "header", "li", "main", "nav", "ol", "p", "section", "table", "tr", "ul"}
+SKIP_TAGS = {"script", "style", "noscript", "template"}
+
+STATS = {"hits": 0, "fallbacks": 0}
+
+
+class _Node:
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+        self.parent = parent
+
+    def elements(self):
+        return [c for c in self.children if isinstance(c, _Node)]
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Node("#document", {}, None)
+        self._current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        node = _Node(tag, {k: v or "" for k, v in attrs}, self._current)
+        self._current.children.append(node)
+        if tag not in VOID_TAGS:
+            self._current = node
+
+    def handle_startendtag(self, tag, attrs):
+        self._current.children.append(_Node(tag, {k: v or "" for k, v in attrs}, self._current))
+
+    def handle_endtag(self, tag):
+        # Close up to the nearest open element with this tag, tolerating unclosed children
+        node = self._current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self._current = node.parent
+
+    def handle_data(self, data):
+        self._current.children.append(data)
+
+
+def _walk(node):
+    for child in node.children:
+        if isinstance(child, _Node):
+            yield child
+            yield from _walk(child)
+
+
+def _matches(root, tag=None, cls=None, attr=None):
+    """Elements under root matching tag, a class-attribute substring and an (name, substring) attribute."""
+    if root is None:
+        return
+    for node in _walk(root):
+        if tag and node.tag != tag:
+            continue
+        if cls and cls not in node.attrs.get("class", ""):
+            continue
+        if attr and attr[1] not in node.attrs.get(attr[0], ""):
+            continue
+        yield node
+
+
+def _find_all(root, tag=None, cls=None, attr=None):
+    return list(_matches(root, tag, cls, attr))
+
+
+def _find(root, tag=None, cls=None, attr=None):
+    # Stop at the first match rather than walking the rest of the tree
+    return next(_matches(root, tag, cls, attr), None)
+
+
+def _raw_text(node):
+    return "".join(c if isinstance(c, str) else _raw_text(c) for c in node.children)
+
+
+def _inner_text(node):
+    """Approximation of innerText: block elements and <br> start new lines, whitespace collapsed."""
+    parts = []
+
+    def collect(n):
+        for c in n.children:
+            if isinstance(c, str):
+                parts.append(c)
+            elif c.tag == "br":
+                parts.append("\n")
+            elif c.tag not in SKIP_TAGS:
+                block = c.tag in BLOCK_TAGS
+                if block:
+                    parts.append("\n")
+                collect(c)
+                if block:
+                    parts.append("\n")
+
+    collect(node)
+    lines = (re.sub(r"[^\S\n]+", " ", line).strip() for line in "".join(parts).split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def _text(node):
+    return _inner_text(node) if node is not None else None
+
+
+def _find_text(root, test):
+    """First smallest element whose normalised text passes `test` (Playwright `text=` semantics)."""
+    if root is None:
+        return None
+    cache = {}
+
+    def matches(n):
+        if id(n) not in cache:
+            cache[id(n)] = n.tag not in SKIP_TAGS and bool(test(" ".join(_inner_text(n).split())))
+        return cache[id(n)]
+
+    for node in _walk(root):
+        if matches(node) and not any(matches(c) for c in node.elements()):
+            return node
+    return None
+
+
+def _next_element_sibling(node):
+    if node is None or node.parent is None:
+        return None
+    siblings = node.parent.elements()
+    index = siblings.index(node)
+    return siblings[index + 1] if index + 1 < len(siblings) else None
+
+
+def _json_ld_product(root):
+    """The first schema.org Product/Drug object in the page's JSON-LD blocks, if any."""
+    for script in _find_all(root, tag="script", attr=("type", "ld+json")):
+        try:
+            data = json.loads(_raw_text(script))
+        except ValueError:
+            continue
+        items = data if isinstance(data, list) else data.get("@graph", [data])
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            types = item.get("@type")
+            types = types if isinstance(types, list) else [types]
+            if "Product" in types or "Drug" in types:
+                return item
+    return None
+
+
+def extract_raw(html):
+    """Build the same raw object PRODUCT_DETAIL_JS returns, from server-rendered HTML."""
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    root = builder.root
+    body = _find(root, tag="body") or root
+
+    storage_nodes = _find_all(root, tag="div", cls="saltInfo DrugHeader__meta-value")
+    storage = storage_nodes[-1] if storage_nodes else None
+    if storage is None:
+        storage = _next_element_sibling(_find_text(body, lambda s: re.search(r"Storage", s, re.IGNORECASE)))
+
+    substitutes = []
+    for card in _find_all(_find(root, tag="div", cls="SubstituteList__container"), tag="div", cls="SubstituteItem__item"):
+        link = _find(card, tag="a")
+        substitutes.append({
+            "name": _text(_find(card, tag="div", cls="SubstituteItem__name")),
+            "href": link.attrs.get("href") if link else None,
+            "price_text": _text(_find(card, tag="div", cls="SubstituteItem__unit-price")),
+            "save_text": _text(_find(card, tag="div", cls="SubstituteItem__save-text")),
+        })
+
+    generic = None
+    generic_container = (_find(root, tag="div", cls="InStockRxSubstitution__rightSku")
+                         or _find(root, tag="div", cls="OOSRxSubstitution__skuCard"))
+    if generic_container is not None:
+        link = _find(generic_container, tag="a", attr=("href", "/drugs/"))
+        generic = {
+            "href": link.attrs.get("href") if link else None,
+            "price_text": _text(_find_text(generic_container, lambda s: re.search(r"₹\s*[\d,]+", s))),
+            "by_text": _text(_find_text(generic_container, lambda s: re.search(r"^by ", s, re.IGNORECASE))),
+            "contains_text": _text(_find_text(generic_container, lambda s: re.search(r"[A-Z][a-z]+.*\([\d.]+\s*[mgu]+\)", s))),
+            "contains_backup_text": _text(_find(root, tag="div", cls="OOSRxSubstitution__saltComposition")),
+        }
+
+    raw = {
+        "name": _text(_find(root, tag="h1", cls="DrugHeader__title")),
+        "composition": _text(_find(root, tag="div", cls="saltInfo")),
+        "marketer": _text(_find(root, tag="div", cls="DrugHeader__meta-value")),
+        "storage": _text(storage),
+        "mrp_text": _text(_find(root, tag="span", cls="DrugPriceBox__slashed-price")),
+        "price_text": _text(_find(root, tag="div", cls="DrugPriceBox__best-price___32JXw")),
+        "price_backup_text": _text(_find(_find(root, tag="div", cls="DrugPriceBox__mrp-wrapper___2o5TZ"),
+                                         tag="div", cls="DrugPriceBox__price___dj2lv")),
+        "discount_text": _text(_find(root, tag="span", cls="DrugPriceBox__slashed-percent")),
+        "pack": _text(_find(root, tag="div", cls="DrugPriceBox__quantity")),
+        "substitutes": substitutes,
+        "generic": generic,
+    }
+
+    # Fill what the markup did not give us from the structured data block
+    product = _json_ld_product(root)
+    if product:
+        offers = product.get("offers") or {}
+        offers = offers[0] if isinstance(offers, list) and offers else offers
+        manufacturer = product.get("manufacturer") or product.get("brand") or {}
+        raw["name"] = raw["name"] or product.get("name")
+        if not raw["price_text"] and not raw["price_backup_text"] and isinstance(offers, dict) and offers.get("price"):
+            raw["price_text"] = f"₹{offers['price']}"
+        if not raw["marketer"] and isinstance(manufacturer, dict):
+            raw["marketer"] = manufacturer.get("name")
+    return raw
+
+
+def _missing_fields(raw):
+    """REQUIRED_FIELDS that parse_product_detail() would leave empty for `raw`."""
+    selling_price = extract_price(raw.get("price_text"))
+    if selling_price is None:
+        selling_price = extract_price(raw.get("price_backup_text"))
+    values = {
+        "medicine_name": raw.get("name"),
+        "medicine_selling_price": selling_price,
+        "medicine_composition": raw.get("composition"),
+    }
+    return [field for field in REQUIRED_FIELDS if not values[field]]
+
+
+async def _get(product_url, client):
+    async with get_limiter('1MG').limit() as permit:
+        async with use_client(client) as c:
+            response = await c.get(product_url)
+        reason = permit.observe_response(response)
+    raise_for_status(response.status_code, reason, product_url)
+    return response
+
+
+async def fetch_raw(product_url, client=None):
+    """
+    Fetch a 1mg product page without a browser and return its raw object (the
+    same shape PRODUCT_DETAIL_JS returns), or None when the page does not
+    parse or lacks any of REQUIRED_FIELDS (the caller should then use Chromium).
+    A request that keeps failing raises (TransientError, PermanentError for
+    404/410, CircuitOpenError) instead: rendering it would only hit the site again.
+    """
+    response = await with_retries('1MG', _get, product_url, client)
+    if response.status_code != 200:
+        logging.debug("Fast path got HTTP %s for %s", response.status_code, product_url)
+        STATS["fallbacks"] += 1
+        return None
+    try:
+        # Parsing a product page is CPU-bound; keep it off the event loop
+        raw = await asyncio.to_thread(extract_raw, response.text)
+    except Exception as e:
+        logging.debug("Fast path failed to parse %s: %s", product_url, e)
+        STATS["fallbacks"] += 1
+        return None
+
+    missing = _missing_fields(raw)
+    if missing:
+        logging.debug("Fast path result for %s is missing %s; falling back to browser", product_url, ", ".join(missing))
+        STATS["fallbacks"] += 1
+        return None
+    STATS["hits"] += 1
+    return raw
+
+
+async def fetch_product_detail(product_url, client=None):
+    """Fetch and parse a 1mg product page without a browser; None if it should be rendered instead (see fetch_raw)."""
+    raw = await fetch_raw(product_url, client)
+    return parse_product_detail(raw) if raw is not None else None
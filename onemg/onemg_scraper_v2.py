@@ -2,12 +2,22 @@ import argparse
 import asyncio
 import os
 from datetime import datetime
-import re
-import json
+import socket
 import sys
+import time
 # import io
-from playwright.async_api import async_playwright #, expect
 from db.db import Database
+from db.writer import AsyncDBWriter, use_writer
+from browser import BrowserManager, use_browser
+from http_client import new_client
+from onemg_http import fetch_product_detail, STATS as FAST_PATH_STATS
+from blocking import get_profile
+from ratelimit import get_limiter
+from resilience import with_retries, raise_for_status, get_breaker, PermanentError, CircuitOpenError
+from logconfig import setup_logging, LazyJson
+from export import export_scraped_data, FORMATS as EXPORT_FORMATS
+from readiness import wait_until_ready, METRICS as READINESS_METRICS
+from onemg_extract import check_product_detail, SEARCH_TILES_JS, PRODUCT_DETAIL_JS, parse_search_tiles, parse_product_detail
 import logging
 
 
@@ -19,151 +29,61 @@ import logging
 if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
-def extract_price(text):
-    if not text:
-        return None
-    cleaned = re.sub(r"[,\s₹]", "", text)
-    match = re.search(r"[\d.]+", cleaned)
-    return float(match.group()) if match else None
 
-
-def extract_discount(text):
-    if not text:
-        return None
-    match = re.search(r"(\d+)%", text)
-    return int(match.group(1)) if match else None
-
-
-def extract_medicine_id(url):
-    if not url:
-        return None
-    # match = re.search(r"/drugs/[\w-]+-(\d+)", url)
-    match = re.search(r"(\d+)$", url)
-    return match.group(1) if match else None
-
-
-async def scrape_1mg(browser, medicine_name, max_products=10):
+async def new_context(browser):
+    """Open a browser context for 1mg with the request-blocking profile installed."""
     context = await browser.new_context(
         user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
         viewport={"width": 1920, "height": 1080},
     )
-    page = await context.new_page()
+    blocking = get_profile('1MG')
+    if blocking:
+        await blocking.install(context)
+    return context
 
-    results = []
 
+async def load_page(browser, url, kind, script, timeout):
+    """
+    One attempt at loading `url` in a fresh context: wait until the page is ready
+    for `kind` and return the result of the in-page `script`. Throttling and
+    HTTP errors are raised as TransientError/PermanentError.
+    """
+    context = await new_context(browser)
+    page = await context.new_page()
     try:
-        search_url = (
-            f"https://www.1mg.com/search/all?name={medicine_name.replace(' ', '+')}"
-        )
-        logging.info(f"Scraping: {search_url}")
-
-        await page.goto(search_url, wait_until="domcontentloaded", timeout=20000)
-        await page.wait_for_timeout(2300)
-
-        logging.debug(f"Page title: {await page.title()}")
-
-        # Get product containers
-        cards = await page.locator('[class*="VerticalProductTile__container"]').all()
-        logging.info(f"Found {len(cards)} product containers for '{medicine_name}'")
-
-        for card in cards:
-            if len(results) >= max_products:
-                break
-
-            try:
-                # Get link from header
-                header_el = card.locator('[class*="VerticalProductTile__header"]').first
-                link = ""
-                if await header_el.count() > 0:
-                    parent_a = header_el.locator("xpath=ancestor::a").first
-                    if await parent_a.count() > 0:
-                        href = await parent_a.get_attribute("href")
-                        link = f"https://www.1mg.com{href}" if href else ""
-
-                # Product name
-                name_el = card.locator('[class*="VerticalProductTile__header"]').first
-                name = (
-                    (await name_el.inner_text()).strip()
-                    if await name_el.count() > 0
-                    else None
-                )
-
-                # Pack size - look in the text for strip of X
-                card_text = await card.inner_text()
-                pack_match = re.search(
-                    r"strip of (\d+ [\w]+)|(\d+ [\w]+) in (strip|tablet|capsule)",
-                    card_text,
-                    re.IGNORECASE,
-                )
-                pack_size = pack_match.group() if pack_match else None
-
-                # If no pack found, try other pattern
-                if not pack_size:
-                    pack_match = re.search(r"of (\d+\s*\w+)", card_text, re.IGNORECASE)
-                    pack_size = pack_match.group() if pack_match else None
-                
-                logging.debug(f"Processing card: {name} | Pack: {pack_size}")
-
-                # Selling Price - look for "Discounted Price"
-                sell_el = card.locator("text=Discounted Price").first
-                selling_price = None
-                if await sell_el.count() > 0:
-                    parent = sell_el.locator("xpath=..").first
-                    txt = (await parent.inner_text()).strip()
-                    price_match = re.search(r"₹?([\d.]+)", txt)
-                    selling_price = float(price_match.group(1)) if price_match else None
-
-                # Original Price (MRP)
-                orig_el = card.locator("text=Original Price").first
-                mrp = None
-                if await orig_el.count() > 0:
-                    parent = orig_el.locator("xpath=..").first
-                    txt = (await parent.inner_text()).strip()
-                    price_match = re.search(r"₹?([\d.]+)", txt)
-                    mrp = float(price_match.group(1)) if price_match else None
-
-                # Discount
-                disc_el = card.locator("text=Discount Percentage").first
-                discount_pct = None
-                if await disc_el.count() > 0:
-                    parent = disc_el.locator("xpath=..").first
-                    txt = (await parent.inner_text()).strip()
-                    discount_pct = extract_discount(txt)
-
-                # Stock - check for Add to Cart
-                cart_btn = card.locator("text=Add to cart").first
-                in_stock = await cart_btn.count() > 0
-                stock_status = "In Stock" if in_stock else "Out of Stock"
-
-                result = {
-                    "medicine_name": name,
-                    "medicine_url": link,
-                    "medicine_id": extract_medicine_id(link),
-                    "mrp": mrp,
-                    "selling_price": selling_price,
-                    "discount_percentage": discount_pct,
-                    "expected_delivery_date": None,
-                    "in_stock": in_stock,
-                    "stock_status": stock_status,
-                    "pack_size_quantity": pack_size,
-                }
-
-                if result["medicine_name"] and result["selling_price"]:
-                    results.append(result)
-                    logging.debug(
-                        f"  [OK] {result['medicine_name'][:45]} | Rs.{result['selling_price']} | {result['discount_percentage']}% off"
-                    )
-
-            except Exception as e:
-                logging.error(f"  [Error] {str(e)[:60]}")
-                continue
-
-    except Exception as e:
-        logging.error(f"Error: {e}")
+        async with get_limiter('1MG').limit() as permit:
+            response = await page.goto(url, wait_until="domcontentloaded", timeout=timeout)
+            status = response.status if response else None
+            reason = permit.observe(status, await page.title())
+            raise_for_status(status, reason, url)
+            await wait_until_ready(page, kind)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("Page title: %s", await page.title())
+        return await page.evaluate(script)
     finally:
         await context.close()
 
-    return results
+
+async def scrape_1mg(browser, medicine_name, max_products=10):
+    search_url = (
+        f"https://www.1mg.com/search/all?name={medicine_name.replace(' ', '+')}"
+    )
+    logging.info(f"Scraping: {search_url}")
+
+    # Read every tile in one in-page script
+    tiles = await with_retries('1MG', load_page, browser, search_url, "1mg_search", SEARCH_TILES_JS, 20000)
+    logging.info(f"Found {len(tiles)} product containers for '{medicine_name}'")
+    return parse_search_tiles(tiles, max_products)
+
+
+async def fetch_product_raw(browser, product_url):
+    """
+    Render a 1mg product page and return the raw object read by PRODUCT_DETAIL_JS.
+    Transient failures are retried; the last error is raised if they persist.
+    """
+    logging.info(f"Scraping product: {product_url}")
+    # Read all fields, substitutes and the generic alternative in one in-page script
+    return await with_retries('1MG', load_page, browser, product_url, "1mg_detail", PRODUCT_DETAIL_JS, 90000)
 
 
 async def scrape_1mg_product_detail(browser, product_url):
@@ -177,241 +97,57 @@ async def scrape_1mg_product_detail(browser, product_url):
     Returns:
         Dictionary with detailed product information
     """
-    context = await browser.new_context(
-        user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        viewport={"width": 1920, "height": 1080},
-    )
-    page = await context.new_page()
-
-    result = {}
-
-    try:
-        logging.info(f"Scraping product: {product_url}")
-        await page.goto(product_url, wait_until="load", timeout=90000)
-        await page.wait_for_timeout(3000)
-        logging.debug(f"{page.content}")
-
-
-        # Medicine Name
-        name_el = page.locator('h1[class*="DrugHeader__title"]').first
-        result["medicine_name"] = (
-            (await name_el.inner_text()).strip() if await name_el.count() > 0 else None
-        )
-        logging.info(f"Extracting details for: {result.get('medicine_name', 'Unknown')}")
-
-        # Medicine Composition
-        comp_el = page.locator('div[class*="saltInfo"]').first
-        result["medicine_composition"] = (
-            (await comp_el.inner_text()).strip() if await comp_el.count() > 0 else None
-        )
-
-        # Medicine Marketer (Manufacturer)
-        mfr_el = page.locator('div[class*="DrugHeader__meta-value"]').first
-        result["medicine_marketer"] = (
-            (await mfr_el.inner_text()).strip() if await mfr_el.count() > 0 else None
-        )
-
-        # Medicine Storage
-        # storage_el = page.locator('text=/Store.*below/i').first
-        storage_el = page.locator('div[class*="saltInfo DrugHeader__meta-value"]').last
-        if await storage_el.count() == 0:
-            storage_el = page.locator('text=/Storage/i').locator("xpath=following-sibling::*").first
-        result["medicine_storage"] = (
-            (await storage_el.inner_text()).strip() if await storage_el.count() > 0 else None
-        )
-
-        # MRP (Original Price)
-        mrp_el = page.locator('span[class*="DrugPriceBox__slashed-price"]').first
-        result["medicine_mrp"] = extract_price(
-            await mrp_el.inner_text() if await mrp_el.count() > 0 else None
-        )
-
-        # Selling Price
-        # price_el = page.locator('div[class*="DrugPriceBox__best-price"]').first
-        price_el = page.locator('div[class*="DrugPriceBox__best-price___32JXw"]')
-        result["medicine_selling_price"] = extract_price(
-            await price_el.inner_text() if await price_el.count() > 0 else None
-        )
-        if result["medicine_selling_price"] is None:
-            price_el_backup = page.locator('div[class*="DrugPriceBox__mrp-wrapper___2o5TZ"]').locator('div[class*="DrugPriceBox__price___dj2lv"]')
-            result["medicine_selling_price"] = extract_price(
-                await price_el_backup.inner_text() if await price_el_backup.count() > 0 else None
-            )
-
-        # Discount Percentage
-        discount_el = page.locator('span[class*="DrugPriceBox__slashed-percent"]').first
-        result["medicine_discount"] = extract_discount(
-            await discount_el.inner_text() if await discount_el.count() > 0 else None
-        )
-
-        # Pack Size Information
-        pack_el = page.locator('div[class*="DrugPriceBox__quantity"]').first
-        result["pack_size_information"] = (
-            (await pack_el.inner_text()).strip() if await pack_el.count() > 0 else None
-        )
-
-        # Substitutes
-        result["substitutes"] = []
-        substitute_section = page.locator('div[class*="SubstituteList__container"]').first
-        if await substitute_section.count() > 0:
-            sub_cards = await substitute_section.locator('div[class*="SubstituteItem__item"]').all()
-            logging.debug(f"  Found {len(sub_cards)} substitutes")
-
-            for sub_card in sub_cards:
-                try:
-                    # Substitute name
-                    sub_name_el = sub_card
-                    sub_name = (
-                        (await sub_name_el.locator('div[class*="SubstituteItem__name"]').inner_text()).strip()
-                        if await sub_name_el.count() > 0
-                        else None
-                    )
-
-                    # Substitute URL
-                    sub_link_el = sub_card.locator('a').first
-                    sub_url = None
-                    if await sub_link_el.count() > 0:
-                        href = await sub_link_el.get_attribute("href")
-                        sub_url = f"https://www.1mg.com{href}" if href else None
-
-                    # Substitute Price
-                    sub_price_el = sub_card.locator('div[class*="SubstituteItem__unit-price"]').first
-                    sub_price = extract_price(
-                        await sub_price_el.inner_text() \
-                        if await sub_price_el.count() > 0 \
-                        else None)
-
-                    # Cheaper percentage
-                    cheaper_perc_el = sub_card.locator('div[class*="SubstituteItem__save-text"]').first
-                    cheaper_pct = \
-                        await cheaper_perc_el.inner_text() \
-                        if await cheaper_perc_el.count() > 0 \
-                        else None
-
-
-                    # Calculate cheaper percentage
-                    # cheaper_pct = None
-                    # if (
-                    #     sub_price
-                    #     and result["medicine_selling_price"]
-                    #     and result["medicine_selling_price"] > 0
-                    # ):
-                    #     cheaper_pct = round(
-                    #         ((result["medicine_selling_price"] - sub_price)
-                    #          / result["medicine_selling_price"])
-                    #         * 100,
-                    #         2,
-                    #     )
-
-                    if sub_name and sub_url:
-                        result["substitutes"].append(
-                            {
-                                "substitute_name": sub_name,
-                                "url": sub_url,
-                                "price_per_unit": sub_price,
-                                "cheaper_percentage": cheaper_pct,
-                            }
-                        )
-                except Exception as e:
-                    logging.error(f"  [Error parsing substitute] {str(e)[:60]}")
-                    continue
-
-        # Generic Alternative Information
-        result["generic_alternative_available"] = False
-        result["generic_alternative"] = None
-
-        # Look for the cheaper alternative section - it's usually in a card showing "Cheaper alternative available"
-        # Try to find the section with class containing "InStockRxSubstitution"
-        generic_container = page.locator('div[class*="InStockRxSubstitution__rightSku"]').first
-        if await generic_container.count() <= 0:
-            generic_container = page.locator('div[class*="OOSRxSubstitution__skuCard"]').first
-
-        if await generic_container.count() > 0:
-            result["generic_alternative_available"] = True
-            logging.info("Generic alternative found.")
-
-            # Get the link to the generic product
-            gen_link_el = generic_container.locator('a[href*="/drugs/"]').first
-            gen_name = None
-            gen_url = None
-
-            if await gen_link_el.count() > 0:
-                # Get URL
-                href = await gen_link_el.get_attribute("href")
-                gen_url = f"https://www.1mg.com{href}" if href and href.startswith("/") else href
-
-            # Get the product name - extract from URL (most reliable method)
-            if gen_url:
-                # URL pattern: /drugs/durite-5-tablet-737465
-                # Extract and convert to title case
-                match = re.search(r"/drugs/([\w-]+)-(\d+)$", gen_url)
-                if match:
-                    slug = match.group(1)
-                    # Convert slug to title: durite-5-tablet -> Durite 5 Tablet
-                    gen_name = " ".join(word.capitalize() for word in slug.split("-"))
-
-            # Generic price - look for price with rupee symbol
-            gen_price = None
-            price_text_el = generic_container.locator('text=/₹\\s*[\\d,]+/').first
-            if await price_text_el.count() > 0:
-                gen_price = extract_price(await price_text_el.inner_text())
-
-            # Generic manufacturer/marketer - look for "by" text
-            gen_by = None
-            by_text_el = generic_container.locator('text=/^by /i').first
-            if await by_text_el.count() > 0:
-                by_text = (await by_text_el.inner_text()).strip()
-                if by_text.lower().startswith("by "):
-                    gen_by = by_text[3:].strip()
-
-            # Generic contains (composition) - look for salt info or composition text
-            gen_contains = None
-            # Try finding text with composition pattern like "Torasemide (5mg)"
-            contains_el = generic_container.locator('text=/[A-Z][a-z]+.*\\([\\d.]+\\s*[mgu]+\\)/').first
-            if await contains_el.count() > 0:
-                gen_contains = (await contains_el.inner_text()).strip()
-            else:
-                contains_el_backup = page.locator('div[class*="OOSRxSubstitution__saltComposition"]').first
-                gen_contains = (await contains_el_backup.inner_text()).strip()
-
-            result["generic_alternative"] = {
-                "alternate_name": gen_name,
-                "url": gen_url,
-                "price": gen_price,
-                "by_who": gen_by,
-                "contains_what": gen_contains,
-            }
-
-        logging.debug(f"  [OK] Extracted: {result['medicine_name']}")
-
-    except Exception as e:
-        logging.error(f"Error scraping product detail for {product_url}: {e}")
-    finally:
-        await context.close()
-
+    raw = await fetch_product_raw(browser, product_url)
+    result = parse_product_detail(raw)
+    logging.info(f"Extracting details for: {result.get('medicine_name', 'Unknown')}")
+    logging.debug("  [OK] Extracted: %s", result['medicine_name'])
     return result
 
 
-async def main(medicine_name, max_products=15, headless=True, dbase=None):
+async def main(medicine_name, max_products=15, headless=True, dbase=None, writer=None, browser_manager=None):
 
     logging.info(f"Searching 1mg for: {medicine_name} (max {max_products} products)")
     logging.info("=" * 50)
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=headless)
+    async with use_browser(browser_manager, headless) as browser:
         results = await scrape_1mg(browser, medicine_name, max_products)
-        await browser.close()
 
     logging.info(f"\n=== Found {len(results)} products ===")
-    logging.debug(f"Results: {results}")
-    # print(json.dumps(results, indent=4))
-    for i, result in enumerate(results, start=1):
-        dbase.insert_medicine(
-            result, '1MG'
-        )
+    logging.debug("Results: %s", results)
+    if writer:
+        await writer.put_medicines(results, '1MG')
+        await writer.put_brand_searched(medicine_name, '1MG')
+    else:
+        dbase.insert_medicines_bulk(results, '1MG')
+        dbase.mark_brand_as_searched(medicine_name, '1MG')
+
+
+async def scrape_detail(product_url, headless=True, browser_manager=None, http_client=None, fast_path=True):
+    """
+    Scrape one 1mg product page and return its details, ready to be stored.
+    Raises RuntimeError if the page yielded neither a name nor a price.
+    """
+    logging.debug("Scraping detailed product info from: %s", product_url)
+    logging.debug("=" * 50)
+    if get_breaker('1MG').is_open:
+        raise CircuitOpenError("1MG circuit is open; skipping request")
+
+    # Try the server-rendered HTML first; render in Chromium only if that does not validate
+    result = await fetch_product_detail(product_url, http_client) if fast_path else None
+    if result is None:
+        async with use_browser(browser_manager, headless) as browser:
+            result = await scrape_1mg_product_detail(browser, product_url)
+
+    logging.debug(f"\n=== Product Details ===")
+    logging.debug("%s", LazyJson(result, indent=4))
+    # An empty page leaves the URL pending instead of storing a blank row
+    check_product_detail(result)
+    result["medicine_url"] = product_url
+    return result
 
 
-async def main2(medicine_url, headless=True, dbase=None):
+async def main2(medicine_url, headless=True, dbase=None, writer=None, browser_manager=None, http_client=None,
+                fast_path=True):
     """
     Main function for scraping detailed product information from a specific 1mg product URL.
     Usage: python onemg_scraper_v2.py --detail <product_url> [--headless]
@@ -424,20 +160,142 @@ async def main2(medicine_url, headless=True, dbase=None):
     # Look for product URL
     product_url = medicine_url
 
-    logging.debug(f"Scraping detailed product info from: {product_url}")
-    logging.debug("=" * 50)
+    result = await scrape_detail(product_url, headless=headless, browser_manager=browser_manager,
+                                 http_client=http_client, fast_path=fast_path)
+    if writer:
+        await writer.put_scraped_details(result, '1MG')
+    else:
+        dbase.insert_scraped_details(result, '1MG')
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=headless)
-        result = await scrape_1mg_product_detail(browser, product_url)
-        await browser.close()
 
-    logging.debug(f"\n=== Product Details ===")
-    logging.debug(json.dumps(result, indent=4))
-    result["medicine_url"] = product_url
-    # result["medicine_id"] = extract_medicine_id(product_url)
-    # logging.debug(f"{extract_medicine_id(product_url)=}")
-    dbase.insert_scraped_details(result, '1MG')
+async def search_many(brands, max_products=15, headless=True, dbase=None, recycle_after=100, concurrency=4,
+                      on_progress=None, writer=None):
+    """
+    Search 1mg for every name in `brands` on one event loop, sharing one browser
+    (recycled every `recycle_after` pages) and one DB writer for the whole batch.
+
+    Up to `concurrency` search pages are open at once; a failing brand is logged
+    and does not affect the others. `on_progress(done, failed, total)` is called
+    after every brand. Pass `writer` to share a running AsyncDBWriter with other
+    searches. Returns a dict with the done/failed counts.
+    """
+    total = len(brands)
+    stats = {"done": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with BrowserManager(headless=headless, recycle_after=recycle_after) as manager, \
+            use_writer(writer, dbase) as writer:
+
+        async def worker(brand):
+            async with semaphore:
+                try:
+                    await main(medicine_name=brand, max_products=max_products, headless=headless, dbase=dbase,
+                               writer=writer, browser_manager=manager)
+                    stats["done"] += 1
+                except Exception as e:
+                    stats["failed"] += 1
+                    logging.error(f"1mg search failed for {brand}: {e}")
+                    if not isinstance(e, CircuitOpenError):
+                        await writer.put_brand_failure(brand, str(e), '1MG')
+            if on_progress:
+                on_progress(stats["done"], stats["failed"], total)
+
+        await asyncio.gather(*(worker(brand) for brand in brands))
+
+    if get_profile('1MG'):
+        get_profile('1MG').log_stats()
+    get_limiter('1MG').log_stats()
+    READINESS_METRICS.log_summary()
+    return stats
+
+
+async def detail_many(urls, headless=True, dbase=None, recycle_after=100, concurrency=8, on_progress=None,
+                      fast_path=True, skipped=None):
+    """
+    Scrape product details for every URL in `urls` on one event loop, sharing one
+    browser (recycled every `recycle_after` pages) and one DB writer for the whole batch.
+
+    Pages are fetched over plain HTTP first (see onemg_http) and only rendered in
+    the browser when that fails, unless `fast_path` is False.
+    Up to `concurrency` product pages are in flight at once. Each result is queued
+    for writing as soon as its page is done, and a failing URL is logged and left
+    pending without affecting the others. `on_progress(done, failed, total)` is
+    called after every URL. URLs that were not fetched because 1mg's circuit
+    was open are appended to `skipped` if given. Returns a dict with the
+    done/failed counts.
+    """
+    total = len(urls)
+    stats = {"done": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.monotonic()
+
+    async with BrowserManager(headless=headless, recycle_after=recycle_after) as manager, \
+            new_client(max_connections=concurrency) as http_client, \
+            AsyncDBWriter(dbase) as writer:
+
+        async def worker(url):
+            async with semaphore:
+                try:
+                    await main2(medicine_url=url, headless=headless, dbase=dbase, writer=writer, browser_manager=manager,
+                                http_client=http_client, fast_path=fast_path)
+                    stats["done"] += 1
+                except Exception as e:
+                    stats["failed"] += 1
+                    logging.error(f"Detail scrape failed for {url}: {e}")
+                    if isinstance(e, CircuitOpenError):
+                        if skipped is not None:
+                            skipped.append(url)
+                    else:
+                        await writer.put_detail_failure(url, str(e), '1MG', permanent=isinstance(e, PermanentError))
+            if on_progress:
+                on_progress(stats["done"], stats["failed"], total)
+
+        await asyncio.gather(*(worker(url) for url in urls))
+
+    if get_profile('1MG'):
+        get_profile('1MG').log_stats()
+    get_limiter('1MG').log_stats()
+    READINESS_METRICS.log_summary()
+    if fast_path:
+        logging.info(f"HTTP fast path: {FAST_PATH_STATS['hits']} pages without browser, {FAST_PATH_STATS['fallbacks']} fell back to Chromium")
+    elapsed = time.monotonic() - start
+    logging.info(f"Detail scraping finished: {stats['done']} done, {stats['failed']} failed in {elapsed:.1f}s "
+                 f"({total / elapsed if elapsed else 0:.2f} pages/s, concurrency {concurrency})")
+    return stats
+
+
+async def detail_pending(headless=True, dbase=None, worker_id=None, batch_size=100, lease_seconds=600, max_attempts=3,
+                         **detail_kwargs):
+    """
+    Drain the pending 1mg backlog in leased batches.
+
+    Each batch is claimed with Database.claim_pending(), so several workers can
+    drain the same backlog without scraping a URL twice. The batch goes through
+    detail_many(), then the leases on anything that failed are released so it is
+    retried until it has been attempted `max_attempts` times; after that it is
+    recorded as failed. URLs skipped because 1mg's circuit breaker was open get
+    their attempt back, and draining stops while the breaker is open (without
+    failing exhausted URLs), so a dead site does not use up every URL's
+    attempts. Returns the summed done/failed counts.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    totals = {"done": 0, "failed": 0}
+    while urls := dbase.claim_pending('1MG', batch_size, worker_id, lease_seconds, max_attempts):
+        logging.info(f"{worker_id} claimed {len(urls)} URLs")
+        skipped = []
+        try:
+            stats = await detail_many(urls, headless=headless, dbase=dbase, skipped=skipped, **detail_kwargs)
+        finally:
+            dbase.release_claims(worker_id, urls, refund=skipped)
+        totals["done"] += stats["done"]
+        totals["failed"] += stats["failed"]
+        if get_breaker('1MG').is_open:
+            logging.error(f"1mg circuit is open; {len(skipped)} URLs were not fetched, leaving the rest of the backlog for a later run")
+            return totals
+    exhausted = dbase.fail_exhausted('1MG', max_attempts)
+    if exhausted:
+        logging.warning(f"{exhausted} URLs failed {max_attempts} times and were marked as failed")
+    return totals
 
 
 if __name__ == "__main__":
@@ -451,18 +309,16 @@ if __name__ == "__main__":
     parser.add_argument("--brands", action="store_true", help="extract brands using search from file")
     parser.add_argument("--detail", action="store_true", help="extract pdp data along with substitutes using url from extracted brands")
     parser.add_argument("--extract_scraped_data", action="store_true", help="extract scraped data from db")
+    parser.add_argument("--export_format", choices=list(EXPORT_FORMATS), default="excel", help="File format for --extract_scraped_data")
+    parser.add_argument("--recycle_after", type=int, default=100, help="Relaunch the browser after this many pages")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="Number of pages scraped in parallel (default 4 in --brands mode, 8 in --detail mode, 4 per worker with --workers)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes (each with its own browser) in --detail mode")
+    parser.add_argument("--batch_size", type=int, default=100, help="Number of pending URLs claimed at a time in --detail mode")
+    parser.add_argument("--no_fast_path", action="store_true", help="Always render product pages in the browser instead of trying plain HTTP first")
 
     args = parser.parse_args()
-    if args.debug:
-        logging.basicConfig(
-            level=logging.DEBUG,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-    else:
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
+    setup_logging(logging.DEBUG if args.debug else logging.INFO)
     # Use absolute path for database relative to script location
     script_dir = os.path.dirname(os.path.abspath(__file__))
     db_path = os.path.join(script_dir, 'db', 'db.duckdb')
@@ -474,18 +330,26 @@ if __name__ == "__main__":
         with open(brands_file, 'r') as f:
             brands = f.read().splitlines()
 
-        for brand in brands:
-            asyncio.run(main(medicine_name=brand, max_products=args.limit, headless=args.headless, dbase=dbase))
+        asyncio.run(search_many(brands, max_products=args.limit, headless=args.headless, dbase=dbase,
+                                recycle_after=args.recycle_after, concurrency=args.concurrency or 4))
 
     if args.detail:
         brands = dbase.get_brands(source='1MG')
         logging.info(f"Found {len(brands)} brands for 1MG")
-        for _, url in brands.iterrows():
-            asyncio.run(main2(medicine_url=url['url'], headless=args.headless, dbase=dbase))
+        if args.workers > 1:
+            # Imported here: workers imports this module for scrape_detail
+            from workers import run_workers
+            run_workers(dbase, workers=args.workers, batch_size=args.batch_size, concurrency=args.concurrency or 4,
+                        headless=args.headless, recycle_after=args.recycle_after, fast_path=not args.no_fast_path)
+        else:
+            asyncio.run(detail_pending(headless=args.headless, dbase=dbase, batch_size=args.batch_size,
+                                       recycle_after=args.recycle_after, concurrency=args.concurrency or 8,
+                                       fast_path=not args.no_fast_path))
 
     if args.extract_scraped_data:
-        df = dbase.extract_scraped_data()
         now = datetime.now().strftime("%Y%m%d_%H%M%S")
-        df.to_excel(f'scraped_data_{now}.xlsx', index=False)
+        path = export_scraped_data(dbase, args.export_format,
+                                   path=f'scraped_data_{now}.{EXPORT_FORMATS[args.export_format]["extension"]}')
+        logging.info(f"Scraped data saved to {path}")
 
-    pass
+    dbase.close()
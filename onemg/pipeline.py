@@ -0,0 +1,187 @@
+"""
+Streaming search -> detail pipeline for 1mg.
+
+Instead of searching every brand first and reading the pending URLs back with
+get_brands() for a separate --detail pass, the stages run concurrently and are
+linked by bounded queues:
+
+    brands -> search -> url_queue -> fetch -> raw_queue -> parse -> AsyncDBWriter
+
+Detail pages are fetched as soon as the first search result arrives. Each stage
+has its own worker count, and a full queue makes the stage in front of it wait,
+so a slow stage throttles the ones feeding it instead of piling up work in
+memory. The writer's own bounded queue is the write stage.
+
+PlatinumRx and TrueMeds search responses already carry the full product
+details, so they have no detail stage to overlap with; use fanout.py for them.
+
+Usage: python pipeline.py [--limit 20] [--fetch_workers 8]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from db.db import Database
+from db.writer import use_writer
+from browser import BrowserManager
+from http_client import new_client
+from onemg_http import fetch_raw, STATS as FAST_PATH_STATS
+from onemg_extract import check_product_detail, parse_product_detail
+from onemg_scraper_v2 import scrape_1mg, fetch_product_raw
+from blocking import get_profile
+from logconfig import setup_logging
+from ratelimit import get_limiter
+from resilience import get_breaker, PermanentError, CircuitOpenError
+from readiness import METRICS as READINESS_METRICS
+
+_DONE = object()
+
+
+async def run_pipeline(brands, max_products=15, headless=True, dbase=None, writer=None, search_workers=2,
+                       fetch_workers=8, parse_workers=2, queue_size=64, recycle_after=100, fast_path=True,
+                       on_progress=None):
+    """
+    Search 1mg for every name in `brands` and scrape the details of every product
+    found, with the search, fetch and parse stages running concurrently.
+
+    `search_workers`, `fetch_workers` and `parse_workers` set each stage's
+    concurrency and `queue_size` bounds the queues between them. A URL returned
+    by more than one search is fetched once. A failing brand or URL is logged and
+    counted without affecting the rest; failed URLs stay pending for a later
+    --detail pass. `on_progress(stats)` is called whenever a URL finishes.
+    Returns the stats dict.
+    """
+    stats = {"searched": 0, "search_failed": 0, "urls": 0, "fetched": 0, "fetch_failed": 0, "parsed": 0,
+             "parse_failed": 0}
+    brand_queue = asyncio.Queue()
+    url_queue = asyncio.Queue(maxsize=queue_size)
+    raw_queue = asyncio.Queue(maxsize=queue_size)
+    seen = set()
+    start = time.monotonic()
+    first_detail = None
+
+    for brand in brands:
+        brand_queue.put_nowait(brand)
+
+    def progress():
+        if on_progress:
+            on_progress(dict(stats))
+
+    async with BrowserManager(headless=headless, recycle_after=recycle_after) as manager, \
+            new_client(max_connections=fetch_workers) as http_client, \
+            use_writer(writer, dbase) as writer:
+
+        async def search_worker():
+            while not brand_queue.empty():
+                brand = brand_queue.get_nowait()
+                try:
+                    async with manager.browser() as browser:
+                        results = await scrape_1mg(browser, brand, max_products)
+                    await writer.put_medicines(results, '1MG')
+                    await writer.put_brand_searched(brand, '1MG')
+                    stats["searched"] += 1
+                except Exception as e:
+                    stats["search_failed"] += 1
+                    logging.error(f"Pipeline search failed for {brand}: {e}")
+                    if not isinstance(e, CircuitOpenError):
+                        await writer.put_brand_failure(brand, str(e), '1MG')
+                    continue
+
+                for result in results:
+                    url = result["medicine_url"]
+                    if url and url not in seen:
+                        seen.add(url)
+                        stats["urls"] += 1
+                        # Waits while the fetch stage is behind
+                        await url_queue.put(url)
+
+        async def fetch_worker():
+            nonlocal first_detail
+            while (url := await url_queue.get()) is not _DONE:
+                if first_detail is None:
+                    first_detail = time.monotonic() - start
+                try:
+                    raw = await fetch_raw(url, http_client) if fast_path and not get_breaker('1MG').is_open else None
+                    if raw is None:
+                        async with manager.browser() as browser:
+                            raw = await fetch_product_raw(browser, url)
+                except Exception as e:
+                    stats["fetch_failed"] += 1
+                    logging.error(f"Pipeline fetch failed for {url}: {e}")
+                    if not isinstance(e, CircuitOpenError):
+                        await writer.put_detail_failure(url, str(e), '1MG', permanent=isinstance(e, PermanentError))
+                    progress()
+                    continue
+                stats["fetched"] += 1
+                await raw_queue.put((url, raw))
+
+        async def parse_worker():
+            while (item := await raw_queue.get()) is not _DONE:
+                url, raw = item
+                try:
+                    result = parse_product_detail(raw)
+                    check_product_detail(result)
+                    result["medicine_url"] = url
+                    await writer.put_scraped_details(result, '1MG')
+                    stats["parsed"] += 1
+                except Exception as e:
+                    stats["parse_failed"] += 1
+                    logging.error(f"Pipeline parse failed for {url}: {e}")
+                    await writer.put_detail_failure(url, str(e), '1MG')
+                progress()
+
+        async def stage(workers, downstream, downstream_workers):
+            # When every worker of a stage has finished, tell each downstream worker to stop
+            await asyncio.gather(*workers)
+            for _ in range(downstream_workers):
+                await downstream.put(_DONE)
+
+        await asyncio.gather(
+            stage([search_worker() for _ in range(search_workers)], url_queue, fetch_workers),
+            stage([fetch_worker() for _ in range(fetch_workers)], raw_queue, parse_workers),
+            asyncio.gather(*(parse_worker() for _ in range(parse_workers))),
+        )
+
+    if get_profile('1MG'):
+        get_profile('1MG').log_stats()
+    get_limiter('1MG').log_stats()
+    READINESS_METRICS.log_summary()
+    if fast_path:
+        logging.info(f"HTTP fast path: {FAST_PATH_STATS['hits']} pages without browser, {FAST_PATH_STATS['fallbacks']} fell back to Chromium")
+    elapsed = time.monotonic() - start
+    first = f"{first_detail:.1f}s" if first_detail is not None else "never"
+    logging.info(f"Pipeline finished in {elapsed:.1f}s (first detail fetch after {first}): {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search 1mg for the brands in brands_to_fetch.txt and scrape product details as results arrive.")
+    parser.add_argument("--limit", type=int, default=15, help="Limit the number of products per search")
+    parser.add_argument("--headless", action="store_true", default=True, help="Run in headless mode")
+    parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    parser.add_argument("--search_workers", type=int, default=2, help="Number of searches run in parallel")
+    parser.add_argument("--fetch_workers", type=int, default=8, help="Number of product pages fetched in parallel")
+    parser.add_argument("--parse_workers", type=int, default=2, help="Number of parse workers")
+    parser.add_argument("--queue_size", type=int, default=64, help="Capacity of the queues between stages")
+    parser.add_argument("--recycle_after", type=int, default=100, help="Relaunch the browser after this many pages")
+    parser.add_argument("--no_fast_path", action="store_true", help="Always render product pages in the browser instead of trying plain HTTP first")
+
+    args = parser.parse_args()
+
+    log_level = logging.DEBUG if args.debug else logging.INFO
+    setup_logging(log_level)
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    dbase = Database(dbpath=os.path.join(script_dir, 'db', 'db.duckdb'))
+    dbase.init()
+
+    with open(os.path.join(script_dir, 'brands_to_fetch.txt'), 'r') as f:
+        brands = [brand for brand in f.read().splitlines() if brand.strip()]
+
+    asyncio.run(run_pipeline(brands, max_products=args.limit, headless=args.headless, dbase=dbase,
+                             search_workers=args.search_workers, fetch_workers=args.fetch_workers,
+                             parse_workers=args.parse_workers, queue_size=args.queue_size,
+                             recycle_after=args.recycle_after, fast_path=not args.no_fast_path))
+
+    dbase.close()
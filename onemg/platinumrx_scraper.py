@@ -7,8 +7,12 @@ import json
 import sys
 import io
 import logging
-import requests
 from db.db import Database
+from db.writer import use_writer
+from http_client import new_client, use_client
+from logconfig import setup_logging
+from ratelimit import get_limiter
+from resilience import with_retries, raise_for_status, CircuitOpenError
 
 if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
@@ -30,7 +34,7 @@ def extract_discount(text):
     match = re.search(r"(\d+)%", str(text))
     return int(match.group(1)) if match else None
 
-async def scrape_platinumrx(medicine_name, max_products=10):
+async def scrape_platinumrx(medicine_name, max_products=10, client=None):
     url = "https://backend.platinumrx.in/pdp/fetchPlpInfo"
     payload = {
         "drugName": medicine_name,
@@ -44,21 +48,27 @@ async def scrape_platinumrx(medicine_name, max_products=10):
         "referer": "https://www.platinumrx.in/"
     }
 
-    try:
-        logging.info(f"Searching PlatinumRx via API for: {medicine_name}")
-        response = requests.post(url, json=payload, headers=headers)
-        if response.status_code != 200:
-            logging.error(f"API failed with status {response.status_code}")
-            return []
+    async def fetch():
+        async with get_limiter('PlatinumRx').limit() as permit:
+            async with use_client(client) as c:
+                response = await c.post(url, json=payload, headers=headers)
+            reason = permit.observe_response(response)
+        raise_for_status(response.status_code, reason, url)
+        return response
+
+    logging.info(f"Searching PlatinumRx via API for: {medicine_name}")
+    # Request failures are retried and then raised, so the caller can tell them from "no results"
+    response = await with_retries('PlatinumRx', fetch)
 
+    try:
         data = response.json()
-        logging.debug(f"API response: {data}")
+        logging.debug("API response: %s", data)
         results = []
         for item in data.get("message", [])[:max_products]:
             master = item.get("masterItemData", {})
             substitute = item.get("substituteItemData", {})
-            logging.debug(f"Master item: {master}")
-            logging.debug(f"Substitute item: {substitute}")
+            logging.debug("Master item: %s", master)
+            logging.debug("Substitute item: %s", substitute)
             if not master: continue
 
             # Use display_name and salt for construction of a tracking URL
@@ -69,9 +79,9 @@ async def scrape_platinumrx(medicine_name, max_products=10):
 
             # URL will be used in stage 2 (detail) to fetch substitutes by salt
             import urllib.parse
-            logging.debug(f"Encoding name: {name}")
+            logging.debug("Encoding name: %s", name)
             encoded_name = urllib.parse.quote(name)
-            logging.debug(f"Encoding id: {drug_id}")
+            logging.debug("Encoding id: %s", drug_id)
             # encoded_id = urllib.parse.quote(drug_id)
             medicine_url = f"https://www.platinumrx.in/medicines/{encoded_name}/{drug_id}"
 
@@ -79,10 +89,10 @@ async def scrape_platinumrx(medicine_name, max_products=10):
             substitute_salt = substitute.get("salt_composition", "")
             substitute_drug_id = substitute.get("master_drug_code", "")
             substitute_manufacturer_name = substitute.get("manufacturer_name", "")
-            logging.debug(f"Substitute manufacturer name: {substitute_manufacturer_name}")
-            logging.debug(f"Encoding substitute name: {substitute_name}")
+            logging.debug("Substitute manufacturer name: %s", substitute_manufacturer_name)
+            logging.debug("Encoding substitute name: %s", substitute_name)
             encoded_substitute_name = urllib.parse.quote(substitute_name)
-            logging.debug(f"Encoding substitute id: {substitute_drug_id}")
+            logging.debug("Encoding substitute id: %s", substitute_drug_id)
             # encoded_substitute_id = urllib.parse.quote(substitute_drug_id)
             substitute_url = f"https://www.platinumrx.in/medicines/{encoded_substitute_name}/{substitute_drug_id}"
 
@@ -122,7 +132,7 @@ async def scrape_platinumrx(medicine_name, max_products=10):
         logging.error(f"Error in scrape_platinumrx: {e}")
         return []
 
-async def scrape_platinumrx_product_detail():
+async def scrape_platinumrx_product_detail(medicine_url):
     """
     Scrapes detailed information for a specific product using its salt composition
     to find all substitutes via the search API.
@@ -217,34 +227,103 @@ async def scrape_platinumrx_product_detail():
     result = {}
     return result
 
-async def main(medicine_name, max_products=15, headless=True, dbase=None):
+async def main(medicine_name, max_products=15, headless=True, dbase=None, writer=None, client=None):
     # Headless param is kept for signature consistency but unused now
     logging.info(f"Searching PlatinumRx for: {medicine_name} (max {max_products} products)")
     
-    results = await scrape_platinumrx(medicine_name, max_products)
+    results = await scrape_platinumrx(medicine_name, max_products, client=client)
 
+    medicines = []
     for result in results:
         result_for_medicine = {'medicine_url': result.get("medicine_url", ""),
                                'medicine_id': result.get("medicine_id", ""), 'medicine_name': result.get("medicine_name", ""), 'mrp': result.get("medicine_mrp", ""), 'pack_size_quantity': result.get("medicine_pack_size_quantity", ""), 'selling_price': result.get("medicine_selling_price", ""), 'discount_percentage': result.get("medicine_discount", "")}
+        medicines.append(result_for_medicine)
 
-        if dbase:
-            dbase.insert_medicine(result_for_medicine, 'PlatinumRx')
-            logging.info(f"Scraping PlatinumRx details for: {result.get('medicine_url', '')}")
-            dbase.insert_scraped_details(result, 'PlatinumRx')
-
-    if dbase:
+    # Search results already carry full details, so both tables are written in one batch each
+    if writer:
+        await writer.put_medicines(medicines, 'PlatinumRx')
+        await writer.put_scraped_details_many(results, 'PlatinumRx')
+        await writer.put_brand_searched(medicine_name, 'PlatinumRx')
+    elif dbase:
+        dbase.insert_medicines_bulk(medicines, 'PlatinumRx')
+        logging.info(f"Storing PlatinumRx details for {len(results)} products")
+        dbase.insert_scraped_details_bulk(results, 'PlatinumRx')
         dbase.mark_brand_as_searched(medicine_name, 'PlatinumRx')
 
 
-async def main2(medicine_url, headless=True, dbase=None):
+async def main2(medicine_url, headless=True, dbase=None, writer=None):
     # Headless param is kept for signature consistency but unused now
     logging.info(f"Scraping PlatinumRx details for: {medicine_url}")
     
     result = await scrape_platinumrx_product_detail(medicine_url)
 
-    if dbase and result:
+    if writer and result:
+        await writer.put_scraped_details(result, 'PlatinumRx')
+    elif dbase and result:
         dbase.insert_scraped_details(result, 'PlatinumRx')
 
+
+async def search_many(brands, max_products=15, headless=True, dbase=None, concurrency=8, on_progress=None,
+                      writer=None):
+    """
+    Search PlatinumRx for every name in `brands` on one event loop, with up to
+    `concurrency` searches in flight over one pooled HTTP client and one DB writer.
+    A failing brand is logged and does not affect the others.
+    `on_progress(done, failed, total)` is called after every brand. Pass `writer`
+    to share a running AsyncDBWriter with other searches.
+    """
+    total = len(brands)
+    stats = {"done": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with new_client() as client, use_writer(writer, dbase) as writer:
+
+        async def worker(brand):
+            async with semaphore:
+                try:
+                    await main(brand, max_products=max_products, headless=headless, dbase=dbase, writer=writer, client=client)
+                    stats["done"] += 1
+                except Exception as e:
+                    stats["failed"] += 1
+                    logging.error(f"PlatinumRx search failed for {brand}: {e}")
+                    if not isinstance(e, CircuitOpenError):
+                        await writer.put_brand_failure(brand, str(e), 'PlatinumRx')
+            if on_progress:
+                on_progress(stats["done"], stats["failed"], total)
+
+        await asyncio.gather(*(worker(brand) for brand in brands))
+
+    get_limiter('PlatinumRx').log_stats()
+    return stats
+
+async def detail_many(urls, headless=True, dbase=None, concurrency=8, on_progress=None, writer=None):
+    """
+    Run the PlatinumRx detail step for every URL in `urls` on one event loop and one
+    DB writer, with up to `concurrency` in flight. A failing URL is logged and
+    does not affect the others. `on_progress(done, failed, total)` is called
+    after every URL. Returns a dict with the done/failed counts.
+    """
+    total = len(urls)
+    stats = {"done": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with use_writer(writer, dbase) as writer:
+
+        async def worker(url):
+            async with semaphore:
+                try:
+                    await main2(url, headless=headless, dbase=dbase, writer=writer)
+                    stats["done"] += 1
+                except Exception as e:
+                    stats["failed"] += 1
+                    logging.error(f"PlatinumRx detail failed for {url}: {e}")
+            if on_progress:
+                on_progress(stats["done"], stats["failed"], total)
+
+        await asyncio.gather(*(worker(url) for url in urls))
+
+    return stats
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Scrape PlatinumRx for medicine information.")
     parser.add_argument("medicine_name", nargs="?", help="Name of the medicine to search for")
@@ -253,11 +332,12 @@ if __name__ == "__main__":
     parser.add_argument("--brands", action="store_true", help="Extract brands using search from file")
     parser.add_argument("--detail", action="store_true", help="Extract detailed data for existing brands")
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of brands (--brands) or URLs (--detail) processed in parallel")
 
     args = parser.parse_args()
     
     log_level = logging.DEBUG if args.debug else logging.INFO
-    logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+    setup_logging(log_level, fmt='%(asctime)s - %(levelname)s - %(message)s')
 
     script_dir = os.path.dirname(os.path.abspath(__file__))
     db_path = os.path.join(script_dir, 'db', 'db.duckdb')
@@ -269,14 +349,16 @@ if __name__ == "__main__":
         if os.path.exists(brands_file):
             with open(brands_file, 'r') as f:
                 brands = f.read().splitlines()
-            for brand in brands:
-                if brand.strip():
-                    asyncio.run(main(brand, max_products=args.limit, headless=args.headless, dbase=dbase))
+            brands = [brand for brand in brands if brand.strip()]
+            asyncio.run(search_many(brands, max_products=args.limit, headless=args.headless, dbase=dbase,
+                                    concurrency=args.concurrency))
     elif args.detail:
         brands = dbase.get_brands(source='PlatinumRx')
-        for _, row in brands.iterrows():
-            asyncio.run(main2(row['url'], headless=args.headless, dbase=dbase))
+        asyncio.run(detail_many(brands['url'].tolist(), headless=args.headless, dbase=dbase,
+                                concurrency=args.concurrency))
     elif args.medicine_name:
         asyncio.run(main(args.medicine_name, max_products=args.limit, headless=args.headless, dbase=dbase))
     else:
         parser.print_help()
+
+    dbase.close()
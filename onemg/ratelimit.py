@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import math
+import re
+import time
+from contextlib import asynccontextmanager
+import httpx
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+# Responses that mean "slow down" rather than "this page is broken"
+THROTTLE_STATUSES = {429, 500, 502, 503, 504}
+CAPTCHA_PATTERN = re.compile(
+    r"captcha|access denied|are you a robot|unusual traffic|pardon our interruption|request blocked",
+    re.IGNORECASE,
+)
+TIMEOUT_ERRORS = (asyncio.TimeoutError, httpx.TimeoutException, PlaywrightTimeoutError)
+
+
+def throttle_reason(status=None, text=None):
+    """Why a response counts as throttling (HTTP status or captcha/block page), or None."""
+    if status in THROTTLE_STATUSES:
+        return f"HTTP {status}"
+    if text and CAPTCHA_PATTERN.search(text[:5000]):
+        return "captcha"
+    return None
+
+
+def html_title(html):
+    """The <title> of an HTML document; block pages are recognised by it, not by the (script-laden) body."""
+    match = re.search(r"<title[^>]*>(.*?)</title>", html[:20000], re.IGNORECASE | re.DOTALL)
+    return match.group(1).strip() if match else None
+
+
+class Permit:
+    """One request's hold on a RateLimiter; call observe()/throttled() to report how it went."""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.reason = None
+
+    def throttled(self, reason):
+        self.reason = self.reason or reason
+
+    def observe(self, status=None, text=None, retry_after=None):
+        """Mark the request throttled if the status or page text says so; honour Retry-After on 429."""
+        reason = throttle_reason(status, text)
+        if reason:
+            self.throttled(reason)
+            if status == 429 and retry_after:
+                self.limiter.pause(retry_after)
+        return reason
+
+    def observe_response(self, response):
+        """observe() for an httpx response: status, Retry-After, and the title of a non-JSON body."""
+        text = None
+        if "json" not in response.headers.get("content-type", ""):
+            text = html_title(response.text) or response.text[:500]
+        return self.observe(response.status_code, text, retry_after(response))
+
+
+class RateLimiter:
+    """
+    Requests-per-second ceiling plus adaptive concurrency for one site.
+
+    A token bucket (`rate` per second, bursts of up to `burst`) spaces out request
+    starts. The number of requests in flight is capped by `concurrency`, which
+    grows by one after every `concurrency` successful requests and is halved
+    (at most once per `cooldown` seconds) when a request is throttled: HTTP
+    429/5xx, a timeout or a captcha page. It never leaves
+    [min_concurrency, max_concurrency]. A 429 with Retry-After also pauses new
+    requests for that long.
+
+    Use `async with limiter.limit() as permit:` around each request. The limiter
+    can be shared by any number of asyncio.run() calls (one at a time); its
+    asyncio state is recreated for each event loop.
+    """
+
+    def __init__(self, name, rate, burst=None, concurrency=4, min_concurrency=1, max_concurrency=16, cooldown=2.0):
+        self.name = name
+        self.rate = rate
+        self.burst = burst or max(1, math.ceil(rate))
+        self.concurrency = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.cooldown = cooldown
+        self.requests = 0
+        self.throttles = 0
+        self.throttle_reasons = {}
+        self.increases = 0
+        self.decreases = 0
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._loop = None
+        self._cond = None
+        self._in_flight = 0
+
+    def _condition(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._cond = asyncio.Condition()
+            self._in_flight = 0
+        return self._cond
+
+    def _reserve_token(self):
+        """Take a token and return how long to wait until it is actually available."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+        return max(wait, self._paused_until - now)
+
+    @asynccontextmanager
+    async def limit(self):
+        cond = self._condition()
+        async with cond:
+            await cond.wait_for(lambda: self._in_flight < self.concurrency)
+            self._in_flight += 1
+        permit = Permit(self)
+        try:
+            wait = self._reserve_token()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                yield permit
+            except TIMEOUT_ERRORS:
+                permit.throttled("timeout")
+                raise
+        finally:
+            self._record(permit)
+            async with cond:
+                self._in_flight -= 1
+                cond.notify_all()
+
+    def _record(self, permit):
+        self.requests += 1
+        if permit.reason is None:
+            self._successes += 1
+            if self._successes >= self.concurrency and self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+                self.increases += 1
+                self._successes = 0
+            return
+
+        self.throttles += 1
+        self.throttle_reasons[permit.reason] = self.throttle_reasons.get(permit.reason, 0) + 1
+        self._successes = 0
+        now = time.monotonic()
+        if now - self._last_decrease >= self.cooldown:
+            self._last_decrease = now
+            previous = self.concurrency
+            self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+            self.decreases += 1
+            logging.warning(f"{self.name} throttled ({permit.reason}); concurrency {previous} -> {self.concurrency}")
+
+    def pause(self, seconds):
+        """Hold back new requests for `seconds` (e.g. from a Retry-After header)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def snapshot(self):
+        return {
+            "source": self.name,
+            "rate_per_s": self.rate,
+            "concurrency": self.concurrency,
+            "in_flight": self._in_flight,
+            "requests": self.requests,
+            "throttled": self.throttles,
+            "throttle_reasons": dict(self.throttle_reasons),
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+    def log_stats(self):
+        logging.info(f"Rate limiter: {self.snapshot()}")
+
+
+def retry_after(response):
+    """Seconds from a Retry-After header given in seconds, or None."""
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+# One limiter per site; 1mg covers both browser pages and the HTTP fast path
+LIMITERS = {
+    "1MG": RateLimiter("1MG", rate=4, concurrency=4, max_concurrency=16),
+    "PlatinumRx": RateLimiter("PlatinumRx", rate=8, concurrency=4, max_concurrency=16),
+    "TrueMeds": RateLimiter("TrueMeds", rate=8, concurrency=4, max_concurrency=16),
+}
+
+
+def get_limiter(source):
+    return LIMITERS[source]
+
+
+def snapshot():
+    """Current limits and counters of every limiter."""
+    return {name: limiter.snapshot() for name, limiter in LIMITERS.items()}
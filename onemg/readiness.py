@@ -0,0 +1,105 @@
+import logging
+import time
+from collections import deque
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+
+class ReadinessCondition:
+    """
+    When a page type is ready to be read.
+
+    Every selector in `required` must be attached to the DOM; `fallback_ms` bounds
+    the wait, after which the page is read as-is. `optional` selectors belong to
+    sections that not every page has (e.g. substitutes); once the page is ready
+    they get up to `optional_ms` more to appear.
+    """
+
+    def __init__(self, required, fallback_ms, optional=(), optional_ms=0):
+        self.required = list(required)
+        self.fallback_ms = fallback_ms
+        self.optional = list(optional)
+        self.optional_ms = optional_ms
+
+
+READINESS = {
+    "1mg_search": ReadinessCondition(
+        required=['[class*="VerticalProductTile__container"]'],
+        fallback_ms=6000,
+    ),
+    "1mg_detail": ReadinessCondition(
+        required=['h1[class*="DrugHeader__title"]', 'div[class*="DrugPriceBox__"]'],
+        fallback_ms=10000,
+        optional=['div[class*="SubstituteList__container"]', 'div[class*="InStockRxSubstitution__rightSku"]',
+                  'div[class*="OOSRxSubstitution__skuCard"]'],
+        optional_ms=1500,
+    ),
+}
+
+
+class ReadinessMetrics:
+    """Time-to-ready per page type, with the last `window` samples kept for percentiles."""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._stats = {}
+
+    def record(self, kind, elapsed_ms, ready):
+        stats = self._stats.setdefault(kind, {"pages": 0, "timeouts": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                              "samples": deque(maxlen=self.window)})
+        stats["pages"] += 1
+        stats["timeouts"] += 0 if ready else 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        stats["samples"].append(elapsed_ms)
+
+    def summary(self):
+        summary = {}
+        for kind, stats in self._stats.items():
+            samples = sorted(stats["samples"])
+            summary[kind] = {
+                "pages": stats["pages"],
+                "timeouts": stats["timeouts"],
+                "avg_ms": round(stats["total_ms"] / stats["pages"]),
+                "p50_ms": round(samples[len(samples) // 2]),
+                "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))]),
+                "max_ms": round(stats["max_ms"]),
+            }
+        return summary
+
+    def log_summary(self):
+        for kind, summary in self.summary().items():
+            logging.info(f"Time to ready [{kind}]: {summary}")
+
+
+METRICS = ReadinessMetrics()
+
+
+async def wait_until_ready(page, kind):
+    """
+    Wait until `page` satisfies the readiness condition for `kind` or its fallback
+    expires. Returns True if the page became ready, False if the fallback was hit.
+    """
+    condition = READINESS[kind]
+    start = time.monotonic()
+    deadline = start + condition.fallback_ms / 1000
+    ready = True
+    for selector in condition.required:
+        # Playwright treats timeout=0 as "no timeout", so never pass less than 1ms
+        remaining_ms = max(1, (deadline - time.monotonic()) * 1000)
+        try:
+            await page.wait_for_selector(selector, state="attached", timeout=remaining_ms)
+        except PlaywrightTimeoutError:
+            ready = False
+            break
+    elapsed_ms = (time.monotonic() - start) * 1000
+    METRICS.record(kind, elapsed_ms, ready)
+
+    if not ready:
+        logging.warning(f"Page not ready after {condition.fallback_ms}ms ({kind}): {page.url}")
+    elif condition.optional:
+        try:
+            await page.wait_for_selector(", ".join(condition.optional), state="attached", timeout=condition.optional_ms)
+        except PlaywrightTimeoutError:
+            pass
+    logging.debug("Page ready in %.0fms (%s): %s", elapsed_ms, kind, page.url)
+    return ready
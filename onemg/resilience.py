@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import random
+import time
+import httpx
+from playwright.async_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+# Statuses that mean the page is gone; anything else >= 400 is retried
+PERMANENT_STATUSES = {404, 410}
+
+
+class TransientError(Exception):
+    """A failure worth retrying: throttling, 5xx, block pages."""
+
+
+class PermanentError(Exception):
+    """A failure retrying will not fix, e.g. a product page that no longer exists."""
+
+
+class CircuitOpenError(Exception):
+    """The source's circuit breaker is open; the call was not attempted."""
+
+
+def is_transient(exc):
+    if isinstance(exc, (TransientError, asyncio.TimeoutError, httpx.TransportError, PlaywrightTimeoutError)):
+        return True
+    # Playwright reports connection failures as plain Errors (net::ERR_CONNECTION_RESET etc.)
+    return isinstance(exc, PlaywrightError) and "net::ERR_" in str(exc)
+
+
+def raise_for_status(status, throttle_reason=None, url=""):
+    """Raise TransientError/PermanentError for a failed response; `throttle_reason` comes from Permit.observe()."""
+    if throttle_reason:
+        raise TransientError(f"{throttle_reason} for {url}")
+    if status in PERMANENT_STATUSES:
+        raise PermanentError(f"HTTP {status} for {url}")
+    if status is not None and status >= 400:
+        raise TransientError(f"HTTP {status} for {url}")
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a source that keeps failing.
+
+    After `failure_threshold` consecutive transient failures the breaker opens
+    and every call fails fast with CircuitOpenError. Once `reset_timeout`
+    seconds have passed one probe call is let through (half-open): success
+    closes the breaker, failure keeps it open for another `reset_timeout`.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=60.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self.rejected = 0
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def before_call(self):
+        if self.opened_at is None:
+            return
+        if self.is_open:
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit is open; skipping request")
+        # Half-open: this call is the probe; hold everyone else back until it reports
+        self.opened_at = time.monotonic()
+        logging.info(f"{self.name} circuit half-open; probing")
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logging.info(f"{self.name} circuit closed")
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                self.trips += 1
+                logging.error(f"{self.name} circuit opened after {self.failures} consecutive failures; "
+                              f"pausing requests for {self.reset_timeout:.0f}s")
+            self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        state = "closed" if self.opened_at is None else "open" if self.is_open else "half-open"
+        return {"source": self.name, "state": state, "consecutive_failures": self.failures, "trips": self.trips,
+                "rejected": self.rejected}
+
+
+BREAKERS = {}
+
+
+def get_breaker(source):
+    if source not in BREAKERS:
+        BREAKERS[source] = CircuitBreaker(source)
+    return BREAKERS[source]
+
+
+def snapshot():
+    return {name: breaker.snapshot() for name, breaker in BREAKERS.items()}
+
+
+async def with_retries(source, fn, *args, attempts=3, base_delay=1.0, max_delay=30.0, **kwargs):
+    """
+    Await `fn(*args, **kwargs)`, retrying transient failures with exponential
+    backoff and full jitter (a random delay up to base_delay * 2**n, capped at
+    max_delay). Every attempt goes through the source's circuit breaker.
+    Non-transient errors are raised at once; the last transient error is raised
+    after `attempts` tries.
+    """
+    breaker = get_breaker(source)
+    for attempt in range(1, attempts + 1):
+        breaker.before_call()
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception as e:
+            if not is_transient(e):
+                # The source answered; whatever went wrong is not a sign that it is down
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt == attempts:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            logging.warning(f"{source}: attempt {attempt}/{attempts} failed ({e}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
@@ -0,0 +1,187 @@
+"""
+Staleness-driven recrawl scheduler.
+
+Each source has a time-to-live per table: how long a brand search
+(brand_searches) and, for 1mg, a product's scraped details (medicine_details)
+stay fresh. When a search or detail scrape succeeds its next_due_at is
+cleared, and the next run stamps it with the refresh time plus the TTL. A run
+only does the work that is due: it searches the due brands (plus any names in
+the brand list that were never searched) and re-queues the due 1mg product
+URLs for a detail pass, most urgent first. Urgency is staleness (how many TTLs
+an item is overdue, never-searched brands first) times its priority (default
+1.0, see Database.set_brand_priority and Database.set_url_priority). plan()
+only reads, so a dry run leaves the database as it was.
+
+PlatinumRx and TrueMeds return the product details with the search, so their
+details are refreshed by re-searching the brand and they have no detail TTL.
+
+Usage: python scheduler.py [--dry_run] [--max_brands 100] [--max_urls 1000] [--prioritize BRAND ...]
+"""
+import argparse
+import asyncio
+import heapq
+import logging
+import os
+import time
+from db.db import Database
+from fanout import search_all, SEARCH_MANY
+from logconfig import setup_logging
+from onemg_scraper_v2 import detail_pending
+
+HOUR = 3600
+
+# Seconds each table stays fresh, per source
+DEFAULT_TTLS = {
+    "1MG": {"brand_searches": 7 * 24 * HOUR, "medicine_details": 3 * 24 * HOUR},
+    "PlatinumRx": {"brand_searches": 24 * HOUR},
+    "TrueMeds": {"brand_searches": 24 * HOUR},
+}
+
+
+def _staleness(overdue_seconds, ttl):
+    """1.0 when just due, +1 for every further TTL overdue; infinite for never done."""
+    if overdue_seconds is None:
+        return float("inf")
+    return 1.0 + max(0.0, overdue_seconds) / ttl
+
+
+def _most_urgent(items, limit):
+    """`items` are (urgency, key); return the keys, most urgent first, at most `limit` of them."""
+    heap = [(-urgency, key) for urgency, key in items]
+    heapq.heapify(heap)
+    return [heapq.heappop(heap)[1] for _ in range(min(len(heap), limit if limit is not None else len(heap)))]
+
+
+def schedule(dbase, sources=None, ttls=None):
+    """Put everything searched or scraped since the last run back on the schedule (sets next_due_at)."""
+    ttls = {**DEFAULT_TTLS, **(ttls or {})}
+    for source in sources or DEFAULT_TTLS:
+        for table, label in (("brand_searches", "searched brands"), ("medicine_details", "scraped products")):
+            if ttls[source].get(table):
+                scheduled = dbase.schedule_refreshes(table, source, ttls[source][table])
+                if scheduled:
+                    logging.info(f"{source}: scheduled {scheduled} {label}")
+
+
+def plan(dbase, sources=None, brands=None, ttls=None, max_brands=None, max_urls=None, priorities=None):
+    """
+    Return what is due now without writing anything:
+    {"brands": {source: [brand names]}, "urls": {source: [urls]}}, each list
+    most urgent first and capped at `max_brands` / `max_urls` per source.
+    Names in `brands` that `source` has never searched are always due.
+    `priorities` ({"brands": {name: priority}, "urls": {url: priority}})
+    override the stored priorities, e.g. to preview them before setting them.
+    """
+    sources = list(sources or DEFAULT_TTLS)
+    ttls = {**DEFAULT_TTLS, **(ttls or {})}
+    brand_priorities = {name.upper(): p for name, p in (priorities or {}).get("brands", {}).items()}
+    url_priorities = (priorities or {}).get("urls", {})
+    due = {"brands": {}, "urls": {}}
+
+    for source in sources:
+        brand_ttl = ttls[source]["brand_searches"]
+        urgency = {}
+        for brand_name, overdue, priority, last_error in dbase.get_due_brands(source, brand_ttl):
+            # A search that failed is retried, but after brands that were never tried
+            staleness = 1.0 if overdue is None and last_error else _staleness(overdue, brand_ttl)
+            urgency[brand_name] = staleness * brand_priorities.get(brand_name, priority)
+        known = set(dbase.get_known_brands(source))
+        # Prioritised brands that were never searched are added by set_brand_priority
+        for brand in [*(brands or []), *brand_priorities]:
+            if brand.upper() not in known and brand.upper() not in urgency:
+                urgency[brand.upper()] = float("inf")
+        due["brands"][source] = _most_urgent([(u, name) for name, u in urgency.items()], max_brands)
+
+        detail_ttl = ttls[source].get("medicine_details")
+        if detail_ttl:
+            urls = [(_staleness(overdue, detail_ttl) * url_priorities.get(url, priority), url)
+                    for url, overdue, priority in dbase.get_due_urls(source, detail_ttl)]
+            due["urls"][source] = _most_urgent(urls, max_urls)
+
+    return due
+
+
+async def run_due(dbase, sources=None, brands=None, ttls=None, max_brands=None, max_urls=None, max_products=15,
+                  headless=True, detail_concurrency=8):
+    """
+    Do one scheduled refresh: schedule what was refreshed since the last run,
+    search the due brands of every source at once,
+    then re-queue the due 1mg URLs and drain the 1mg pending queue (which also
+    picks up products the searches found). Returns the plan and the stats.
+    """
+    start = time.monotonic()
+    schedule(dbase, sources, ttls)
+    due = plan(dbase, sources, brands, ttls, max_brands, max_urls)
+    stats = {}
+
+    searches = {source: names for source, names in due["brands"].items() if names}
+    if searches:
+        stats["search"] = await search_all(searches, sources=list(searches), max_products=max_products,
+                                           headless=headless, dbase=dbase)
+
+    for source, urls in due["urls"].items():
+        dbase.requeue_urls(urls)
+        logging.info(f"{source}: re-queued {len(urls)} stale products")
+    if "1MG" in due["urls"]:
+        stats["detail"] = await detail_pending(headless=headless, dbase=dbase, concurrency=detail_concurrency)
+
+    logging.info(f"Scheduled run finished in {time.monotonic() - start:.1f}s: "
+                 f"{sum(map(len, due['brands'].values()))} brand searches, "
+                 f"{sum(map(len, due['urls'].values()))} product refreshes due; {stats}")
+    return due, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh whatever is due: stale brand searches and stale 1mg product details.")
+    parser.add_argument("--sources", nargs="+", choices=list(SEARCH_MANY), default=list(SEARCH_MANY),
+                        help="Sources to refresh (default: all)")
+    parser.add_argument("--brand_ttl_hours", type=float, help="Hours a brand search stays fresh (overrides the per-source defaults)")
+    parser.add_argument("--detail_ttl_hours", type=float, help="Hours 1mg product details stay fresh (default 72)")
+    parser.add_argument("--max_brands", type=int, help="At most this many brand searches per source")
+    parser.add_argument("--max_urls", type=int, help="At most this many product refreshes per source")
+    parser.add_argument("--prioritize", nargs="+", metavar="BRAND", help="Set the priority of these brands on the selected sources")
+    parser.add_argument("--prioritize_urls", nargs="+", metavar="URL", help="Set the priority of these 1mg product URLs")
+    parser.add_argument("--priority", type=float, default=5.0,
+                        help="Priority used by --prioritize and --prioritize_urls (default 5.0; others are 1.0)")
+    parser.add_argument("--dry_run", action="store_true",
+                        help="Only show what is due (with the --prioritize* priorities applied); writes nothing")
+    parser.add_argument("--limit", type=int, default=15, help="Limit the number of products per search")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of 1mg product pages scraped in parallel")
+    parser.add_argument("--headless", action="store_true", default=True, help="Run in headless mode")
+    parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+
+    args = parser.parse_args()
+    setup_logging(logging.DEBUG if args.debug else logging.INFO)
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    dbase = Database(dbpath=os.path.join(script_dir, 'db', 'db.duckdb'))
+    dbase.init()
+
+    with open(os.path.join(script_dir, 'brands_to_fetch.txt'), 'r') as f:
+        brands = [brand for brand in f.read().splitlines() if brand.strip()]
+
+    ttls = {source: dict(table_ttls) for source, table_ttls in DEFAULT_TTLS.items()}
+    for table_ttls in ttls.values():
+        if args.brand_ttl_hours is not None:
+            table_ttls["brand_searches"] = args.brand_ttl_hours * HOUR
+        if args.detail_ttl_hours is not None and "medicine_details" in table_ttls:
+            table_ttls["medicine_details"] = args.detail_ttl_hours * HOUR
+
+    if args.dry_run:
+        priorities = {"brands": {name: args.priority for name in args.prioritize or []},
+                      "urls": {url: args.priority for url in args.prioritize_urls or []}}
+        due = plan(dbase, args.sources, brands, ttls, args.max_brands, args.max_urls, priorities=priorities)
+        for source in args.sources:
+            names = due["brands"].get(source, [])
+            logging.info(f"{source}: {len(names)} brands due {names[:20]}, {len(due['urls'].get(source, []))} products due")
+    else:
+        if args.prioritize:
+            for source in args.sources:
+                dbase.set_brand_priority(args.prioritize, source, args.priority)
+        if args.prioritize_urls:
+            found = dbase.set_url_priority(args.prioritize_urls, args.priority)
+            logging.info(f"Set the priority of {found} of {len(args.prioritize_urls)} product URLs")
+        asyncio.run(run_due(dbase, args.sources, brands, ttls, args.max_brands, args.max_urls, max_products=args.limit,
+                            headless=args.headless, detail_concurrency=args.concurrency))
+
+    dbase.close()
@@ -9,7 +9,11 @@ import sys
 import logging
 # from playwright.async_api import async_playwright
 from db.db import Database
-import requests
+from db.writer import use_writer
+from http_client import new_client, use_client
+from logconfig import setup_logging
+from ratelimit import get_limiter
+from resilience import with_retries, raise_for_status, CircuitOpenError
 
 if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
@@ -31,7 +35,7 @@ def extract_discount(text):
     return float(match.group(1)) if match else None
 
 
-async def scrape_truemeds(medicine_name, max_products=10):
+async def scrape_truemeds(medicine_name, max_products=10, client=None):
     url = "https://nal.tmmumbai.in/CustomerService/getSearchResult"
     querystring = {"warehouseId":"20","elasticSearchType":"SKU_BRAND_SEARCH","searchString":medicine_name,"isMultiSearch":"true","pageName":"srp","variantId":"18","platform":"m_web"}
     headers = {
@@ -51,23 +55,29 @@ async def scrape_truemeds(medicine_name, max_products=10):
         "strict-origin-when-cross-origin": "*"
     }
 
-    try:
-        logging.info(f"Searching TrueMeds via API for: {medicine_name}")
-        response = requests.get(url, headers=headers, params=querystring)
-        if response.status_code != 200:
-            logging.error(f"API failed with status {response.status_code}")
-            return []
+    async def fetch():
+        async with get_limiter('TrueMeds').limit() as permit:
+            async with use_client(client) as c:
+                response = await c.get(url, headers=headers, params=querystring)
+            reason = permit.observe_response(response)
+        raise_for_status(response.status_code, reason, url)
+        return response
+
+    logging.info(f"Searching TrueMeds via API for: {medicine_name}")
+    # Request failures are retried and then raised, so the caller can tell them from "no results"
+    response = await with_retries('TrueMeds', fetch)
 
+    try:
         data = response.json()
-        logging.debug(f"API response: {data}")
+        logging.debug("API response: %s", data)
         results = []
         for item in data.get("responseData", []).get("elasticProductDetails", []):
             master = item.get("product", {})
             substitute = item.get("suggestion", {})
             if not substitute:
                 substitute = {k: "" for k, v in master.items()}
-            logging.debug(f"Master item: {master}")
-            logging.debug(f"Substitute item: {substitute}")
+            logging.debug("Master item: %s", master)
+            logging.debug("Substitute item: %s", substitute)
             if not master: continue
 
             # Use display_name and salt for construction of a tracking URL
@@ -129,7 +139,7 @@ async def scrape_truemeds(medicine_name, max_products=10):
         return []
 
 
-async def scrape_truemeds_product_detail(browser, product_url):
+async def scrape_truemeds_product_detail(product_url):
     """
     Scrapes detailed information for a specific product from TrueMeds using product page selectors.
     """
@@ -232,12 +242,13 @@ async def scrape_truemeds_product_detail(browser, product_url):
     return result
 
 
-async def main(medicine_name, max_products=15, headless=True, dbase=None):
+async def main(medicine_name, max_products=15, headless=True, dbase=None, writer=None, client=None):
     # Headless param is kept for signature consistency but unused now
     logging.info(f"Searching TrueMeds for: {medicine_name} (max {max_products} products)")
 
-    results = await scrape_truemeds(medicine_name, max_products)
+    results = await scrape_truemeds(medicine_name, max_products, client=client)
 
+    medicines = []
     for result in results:
         result_for_medicine = {'medicine_url': result.get("medicine_url", ""),
                                'medicine_id': result.get("medicine_id", ""),
@@ -245,25 +256,93 @@ async def main(medicine_name, max_products=15, headless=True, dbase=None):
                                'pack_size_quantity': result.get("medicine_pack_size_quantity", ""),
                                'selling_price': result.get("medicine_selling_price", ""),
                                'discount_percentage': result.get("medicine_discount", "")}
+        medicines.append(result_for_medicine)
 
-        if dbase:
-            dbase.insert_medicine(result_for_medicine, 'TrueMeds')
-            logging.info(f"Scraping TrueMeds details for: {result.get('medicine_url', '')}")
-            dbase.insert_scraped_details(result, 'TrueMeds')
-
-    if dbase:
+    # Search results already carry full details, so both tables are written in one batch each
+    if writer:
+        await writer.put_medicines(medicines, 'TrueMeds')
+        await writer.put_scraped_details_many(results, 'TrueMeds')
+        await writer.put_brand_searched(medicine_name, 'TrueMeds')
+    elif dbase:
+        dbase.insert_medicines_bulk(medicines, 'TrueMeds')
+        logging.info(f"Storing TrueMeds details for {len(results)} products")
+        dbase.insert_scraped_details_bulk(results, 'TrueMeds')
         dbase.mark_brand_as_searched(medicine_name, 'TrueMeds')
 
 
-async def main2(medicine_url, headless=True, dbase=None):
+async def main2(medicine_url, headless=True, dbase=None, writer=None):
     # Headless param is kept for signature consistency but unused now
     logging.info(f"Scraping TrueMeds details for: {medicine_url}")
 
     result = await scrape_truemeds_product_detail(medicine_url)
 
-    if dbase and result:
+    if writer and result:
+        await writer.put_scraped_details(result, 'TrueMeds')
+    elif dbase and result:
         dbase.insert_scraped_details(result, 'TrueMeds')
 
+
+async def search_many(brands, max_products=15, headless=True, dbase=None, concurrency=8, on_progress=None,
+                      writer=None):
+    """
+    Search TrueMeds for every name in `brands` on one event loop, with up to
+    `concurrency` searches in flight over one pooled HTTP client and one DB writer.
+    A failing brand is logged and does not affect the others.
+    `on_progress(done, failed, total)` is called after every brand. Pass `writer`
+    to share a running AsyncDBWriter with other searches.
+    """
+    total = len(brands)
+    stats = {"done": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with new_client() as client, use_writer(writer, dbase) as writer:
+
+        async def worker(brand):
+            async with semaphore:
+                try:
+                    await main(brand, max_products=max_products, headless=headless, dbase=dbase, writer=writer, client=client)
+                    stats["done"] += 1
+                except Exception as e:
+                    stats["failed"] += 1
+                    logging.error(f"TrueMeds search failed for {brand}: {e}")
+                    if not isinstance(e, CircuitOpenError):
+                        await writer.put_brand_failure(brand, str(e), 'TrueMeds')
+            if on_progress:
+                on_progress(stats["done"], stats["failed"], total)
+
+        await asyncio.gather(*(worker(brand) for brand in brands))
+
+    get_limiter('TrueMeds').log_stats()
+    return stats
+
+async def detail_many(urls, headless=True, dbase=None, concurrency=8, on_progress=None, writer=None):
+    """
+    Run the TrueMeds detail step for every URL in `urls` on one event loop and one
+    DB writer, with up to `concurrency` in flight. A failing URL is logged and
+    does not affect the others. `on_progress(done, failed, total)` is called
+    after every URL. Returns a dict with the done/failed counts.
+    """
+    total = len(urls)
+    stats = {"done": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with use_writer(writer, dbase) as writer:
+
+        async def worker(url):
+            async with semaphore:
+                try:
+                    await main2(url, headless=headless, dbase=dbase, writer=writer)
+                    stats["done"] += 1
+                except Exception as e:
+                    stats["failed"] += 1
+                    logging.error(f"TrueMeds detail failed for {url}: {e}")
+            if on_progress:
+                on_progress(stats["done"], stats["failed"], total)
+
+        await asyncio.gather(*(worker(url) for url in urls))
+
+    return stats
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Scrape TrueMeds for medicine information.")
     parser.add_argument("medicine_name", nargs="?", help="Name of the medicine to search for")
@@ -272,11 +351,12 @@ if __name__ == "__main__":
     parser.add_argument("--brands", action="store_true", help="Extract brands using search from file")
     parser.add_argument("--detail", action="store_true", help="Extract detailed data for existing brands")
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of brands (--brands) or URLs (--detail) processed in parallel")
 
     args = parser.parse_args()
     
     log_level = logging.DEBUG if args.debug else logging.INFO
-    logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+    setup_logging(log_level, fmt='%(asctime)s - %(levelname)s - %(message)s')
 
     script_dir = os.path.dirname(os.path.abspath(__file__))
     db_path = os.path.join(script_dir, 'db', 'db.duckdb')
@@ -288,14 +368,16 @@ if __name__ == "__main__":
         if os.path.exists(brands_file):
             with open(brands_file, 'r') as f:
                 brands = f.read().splitlines()
-            for brand in brands:
-                if brand.strip():
-                    asyncio.run(main(brand, max_products=args.limit, headless=args.headless, dbase=dbase))
+            brands = [brand for brand in brands if brand.strip()]
+            asyncio.run(search_many(brands, max_products=args.limit, headless=args.headless, dbase=dbase,
+                                    concurrency=args.concurrency))
     elif args.detail:
         brands = dbase.get_brands(source='TrueMeds')
-        for _, row in brands.iterrows():
-            asyncio.run(main2(row['url'], headless=args.headless, dbase=dbase))
+        asyncio.run(detail_many(brands['url'].tolist(), headless=args.headless, dbase=dbase,
+                                concurrency=args.concurrency))
     elif args.medicine_name:
         asyncio.run(main(args.medicine_name, max_products=args.limit, headless=args.headless, dbase=dbase))
     else:
         parser.print_help()
+
+    dbase.close()
@@ -0,0 +1,181 @@
+"""
+Multi-process 1mg detail scraping.
+
+One event loop driving one Chromium tops out at a core or two. run_workers()
+starts N worker processes, each with its own event loop, browser and HTTP
+client, and keeps them fed with batches of pending URLs that the parent leases
+per worker with Database.claim_pending(). Workers never open the database:
+they send their results back over a queue and the parent stores them with the
+bulk insert, so DuckDB has a single writer. The parent also aggregates
+progress and throughput across all workers.
+"""
+import asyncio
+import logging
+import math
+import multiprocessing as mp
+import os
+import queue
+import socket
+import time
+from browser import BrowserManager
+from http_client import new_client
+from onemg_scraper_v2 import scrape_detail
+from logconfig import setup_logging
+from ratelimit import get_limiter
+from resilience import PermanentError, CircuitOpenError
+
+_LOG_FORMAT = '%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s'
+
+
+async def _worker_loop(worker_id, tasks, results, headless, concurrency, recycle_after, fast_path):
+    semaphore = asyncio.Semaphore(concurrency)
+    async with BrowserManager(headless=headless, recycle_after=recycle_after) as manager, \
+            new_client(max_connections=concurrency) as http_client:
+
+        async def scrape(url):
+            async with semaphore:
+                try:
+                    result = await scrape_detail(url, headless=headless, browser_manager=manager,
+                                                 http_client=http_client, fast_path=fast_path)
+                    results.put(("ok", worker_id, url, result))
+                except Exception as e:
+                    logging.error(f"Detail scrape failed for {url}: {e}")
+                    results.put(("failed", worker_id, url, {"error": str(e), "permanent": isinstance(e, PermanentError),
+                                                            "circuit_open": isinstance(e, CircuitOpenError)}))
+
+        while (batch := await asyncio.to_thread(tasks.get)) is not None:
+            await asyncio.gather(*(scrape(url) for url in batch))
+            results.put(("batch_done", worker_id, None, None))
+    get_limiter('1MG').log_stats()
+
+
+def _worker_main(worker_id, tasks, results, headless, concurrency, recycle_after, fast_path, log_level, workers):
+    setup_logging(log_level, fmt=_LOG_FORMAT)
+    # Each process has its own limiter, so split the site's rate ceiling between them
+    limiter = get_limiter('1MG')
+    limiter.rate /= workers
+    limiter.burst = max(1, math.ceil(limiter.rate))
+    asyncio.run(_worker_loop(worker_id, tasks, results, headless, concurrency, recycle_after, fast_path))
+
+
+def run_workers(dbase, workers=4, batch_size=50, concurrency=4, headless=True, recycle_after=100, fast_path=True,
+                lease_seconds=600, max_attempts=3, flush_size=200, on_progress=None):
+    """
+    Drain the pending 1mg backlog with `workers` processes of `concurrency` pages each.
+
+    Each worker holds at most one leased batch of `batch_size` URLs; when it
+    reports the batch done the parent stores the results, releases the leases
+    of anything that failed and claims the worker's next batch. Results are
+    written in bulk every `flush_size` rows and at the end of every batch.
+    Failed URLs have their error recorded; a worker whose circuit breaker
+    opens is stopped after its batch, the URLs it skipped get their attempt
+    back and exhausted URLs are not failed on that run. A worker process that dies has its
+    leases released and is not replaced.
+    `on_progress(stats)` is called after every URL. Returns the totals.
+    """
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    procs, tasks, batches = {}, {}, {}
+    stats = {"done": 0, "failed": 0, "per_worker": {}}
+    buffer, failures = [], []
+    circuit_open = set()
+    # URLs each worker could not fetch because its circuit was open; their attempts are refunded
+    skipped = {}
+    start = last_report = time.monotonic()
+
+    def flush():
+        if buffer:
+            dbase.insert_scraped_details_bulk(buffer, '1MG')
+            buffer.clear()
+        if failures:
+            dbase.record_failures(failures)
+            failures.clear()
+
+    def dispatch(worker_id):
+        urls = dbase.claim_pending('1MG', batch_size, worker_id, lease_seconds, max_attempts)
+        batches[worker_id] = urls
+        tasks[worker_id].put(urls or None)
+        if not urls:
+            del batches[worker_id]
+
+    try:
+        for i in range(workers):
+            worker_id = f"{prefix}:w{i}"
+            tasks[worker_id] = ctx.Queue()
+            stats["per_worker"][worker_id] = {"done": 0, "failed": 0}
+            proc = ctx.Process(target=_worker_main, name=f"w{i}",
+                               args=(worker_id, tasks[worker_id], results, headless, concurrency,
+                                     recycle_after, fast_path, logging.getLogger().level, workers))
+            proc.start()
+            procs[worker_id] = proc
+            dispatch(worker_id)
+
+        while batches:
+            try:
+                kind, worker_id, url, payload = results.get(timeout=1)
+            except queue.Empty:
+                for worker_id in [w for w in batches if not procs[w].is_alive()]:
+                    logging.error(f"Worker {worker_id} exited with code {procs[worker_id].exitcode}; releasing its batch")
+                    flush()
+                    dbase.release_claims(worker_id, batches.pop(worker_id), refund=skipped.pop(worker_id, ()))
+                continue
+
+            if kind == "batch_done":
+                flush()
+                dbase.release_claims(worker_id, batches.pop(worker_id), refund=skipped.pop(worker_id, ()))
+                if worker_id in circuit_open:
+                    # The site is failing for this worker; stop it rather than burn the backlog's attempts
+                    logging.error(f"Worker {worker_id} hit an open 1mg circuit; stopping it")
+                    tasks[worker_id].put(None)
+                else:
+                    dispatch(worker_id)
+                continue
+
+            if kind == "ok":
+                buffer.append(payload)
+                if len(buffer) >= flush_size:
+                    flush()
+            elif payload["circuit_open"]:
+                circuit_open.add(worker_id)
+                skipped.setdefault(worker_id, []).append(url)
+            else:
+                failures.append((url, payload["error"], payload["permanent"]))
+            stats["done" if kind == "ok" else "failed"] += 1
+            stats["per_worker"][worker_id]["done" if kind == "ok" else "failed"] += 1
+            if on_progress:
+                on_progress(stats)
+
+            now = time.monotonic()
+            if now - last_report >= 10:
+                last_report = now
+                logging.info(f"Workers: {stats['done']} done, {stats['failed']} failed, "
+                             f"{(stats['done'] + stats['failed']) / (now - start):.2f} pages/s")
+    finally:
+        try:
+            flush()
+        finally:
+            for worker_id, proc in procs.items():
+                if worker_id in batches:
+                    # Interrupted: stop the worker and hand its batch back
+                    proc.terminate()
+                    dbase.release_claims(worker_id, batches.pop(worker_id), refund=skipped.pop(worker_id, ()))
+                elif proc.is_alive():
+                    # Startup failed before this worker got a batch (or its stop signal); tell it to exit
+                    tasks[worker_id].put(None)
+                proc.join()
+
+    if circuit_open:
+        # Attempts say nothing while the site is down; fail exhausted URLs on a healthy run
+        logging.error(f"1mg circuit opened for {len(circuit_open)} workers; leaving the rest of the backlog for a later run")
+    else:
+        exhausted = dbase.fail_exhausted('1MG', max_attempts)
+        if exhausted:
+            logging.warning(f"{exhausted} URLs failed {max_attempts} times and were marked as failed")
+    elapsed = time.monotonic() - start
+    logging.info(f"Workers finished: {stats['done']} done, {stats['failed']} failed in {elapsed:.1f}s "
+                 f"({(stats['done'] + stats['failed']) / elapsed if elapsed else 0:.2f} pages/s, "
+                 f"{workers} workers x {concurrency} pages)")
+    for worker_id, worker_stats in stats["per_worker"].items():
+        logging.info(f"  {worker_id}: {worker_stats}")
+    return stats